@@ -1,10 +1,11 @@
-from flask import Blueprint, app, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User
+from models import db
 from services.agronomic_service import AgronomicService 
 from services.weather_service import WeatherService
 from services.ml_service import MLService
-from services.market_service import MarketService
+from utils.registry import get_service
+from utils.user_cache import load_user
 
 market_bp = Blueprint('market', __name__)
 
@@ -12,7 +13,7 @@ market_bp = Blueprint('market', __name__)
 @jwt_required()
 def get_market_prices():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -23,18 +24,51 @@ def get_market_prices():
     district = request.args.get('district')
     
     # Get market service
-    market_service = MarketService(api_key=app.config['MARKET_API_KEY'])
+    market_service = get_service('market')
     
     # Get market prices
     prices = market_service.get_market_prices(crop, state, district)
     
     return jsonify(prices)
 
+@market_bp.route('/prices/batch', methods=['POST'])
+@jwt_required()
+def get_market_prices_batch():
+    current_user_id = get_jwt_identity()
+    user = load_user(current_user_id)
+    
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    # Get parameters: {"items": [{"crop": ..., "state": ..., "district": ...}, ...]}
+    data = request.get_json()
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'A non-empty list of items is required'}), 400
+    if len(items) > current_app.config['MARKET_BATCH_MAX_ITEMS']:
+        return jsonify({'error': f"At most {current_app.config['MARKET_BATCH_MAX_ITEMS']} items are allowed"}), 400
+    
+    keys = [
+        (item.get('crop', 'wheat'), item.get('state', user.location or 'Delhi'), item.get('district'))
+        for item in items
+    ]
+    if not all(isinstance(crop, str) and isinstance(state, str) and (district is None or isinstance(district, str))
+               for crop, state, district in keys):
+        return jsonify({'error': 'crop and state must be strings, district a string or null'}), 400
+    
+    # Get market service
+    market_service = get_service('market')
+    
+    # Get market prices for every key
+    prices = market_service.get_market_prices_batch(keys)
+    
+    return jsonify(prices)
+
 @market_bp.route('/forecast', methods=['GET'])
 @jwt_required()
 def get_price_forecast():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -45,7 +79,7 @@ def get_price_forecast():
     months = int(request.args.get('months', 12))
     
     # Get market service
-    market_service = MarketService(api_key=app.config['MARKET_API_KEY'])
+    market_service = get_service('market')
     
     # Get price forecast
     forecast = market_service.get_price_forecast(crop, state, months)
@@ -56,7 +90,7 @@ def get_price_forecast():
 @jwt_required()
 def get_market_comparison():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -66,7 +100,7 @@ def get_market_comparison():
     state = request.args.get('state', user.location or 'Delhi')
     
     # Get market service
-    market_service = MarketService(api_key=app.config['MARKET_API_KEY'])
+    market_service = get_service('market')
     
     # Get market comparison
     comparison = market_service.get_market_comparison(crop, state)
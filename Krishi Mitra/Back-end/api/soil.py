@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, FarmProfile
-from services.agronomic_service import AgronomicService
+from models import db, FarmProfile
+from utils.registry import get_service
+from utils.user_cache import load_user
 
 soil_bp = Blueprint('soil', __name__)
 
@@ -9,13 +10,13 @@ soil_bp = Blueprint('soil', __name__)
 @jwt_required()
 def get_soil_recommendations():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
     # Get agronomic service
-    agronomic_service = AgronomicService()
+    agronomic_service = get_service('agronomic')
     
     # Get crop recommendations
     recommendations = agronomic_service.get_crop_recommendations(user)
@@ -26,7 +27,7 @@ def get_soil_recommendations():
 @jwt_required()
 def get_crop_advisory():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -35,7 +36,7 @@ def get_crop_advisory():
     crop_name = request.args.get('crop', 'rice')
     
     # Get agronomic service
-    agronomic_service = AgronomicService()
+    agronomic_service = get_service('agronomic')
     
     # Get crop advisory
     advisory = agronomic_service.get_crop_advisory(user, crop_name)
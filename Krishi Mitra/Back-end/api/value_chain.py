@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User
-from services.value_chain_service import ValueChainService
+from models import db
+from utils.registry import get_service
+from utils.user_cache import load_user
 
 value_chain_bp = Blueprint('value_chain', __name__)
 
@@ -9,7 +10,7 @@ value_chain_bp = Blueprint('value_chain', __name__)
 @jwt_required()
 def get_buyers():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -20,7 +21,7 @@ def get_buyers():
     district = request.args.get('district')
     
     # Get value chain service
-    value_chain_service = ValueChainService()
+    value_chain_service = get_service('value_chain')
     
     # Get buyers
     buyers = value_chain_service.get_buyers(crop, state, district)
@@ -31,7 +32,7 @@ def get_buyers():
 @jwt_required()
 def get_suppliers():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -42,7 +43,7 @@ def get_suppliers():
     district = request.args.get('district')
     
     # Get value chain service
-    value_chain_service = ValueChainService()
+    value_chain_service = get_service('value_chain')
     
     # Get suppliers
     suppliers = value_chain_service.get_input_suppliers(crop, state, district)
@@ -53,7 +54,7 @@ def get_suppliers():
 @jwt_required()
 def get_logistics():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -63,7 +64,7 @@ def get_logistics():
     district = request.args.get('district')
     
     # Get value chain service
-    value_chain_service = ValueChainService()
+    value_chain_service = get_service('value_chain')
     
     # Get logistics providers
     logistics = value_chain_service.get_logistics_providers(state, district)
@@ -74,7 +75,7 @@ def get_logistics():
 @jwt_required()
 def market_listings():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -86,7 +87,7 @@ def market_listings():
         quantity = data.get('quantity', 0)
         price = data.get('price', 0)
         
-        value_chain_service = ValueChainService()
+        value_chain_service = get_service('value_chain')
         listing = value_chain_service.create_market_listing(user, crop, quantity, price)
         
         return jsonify(listing)
@@ -95,7 +96,7 @@ def market_listings():
         crop = request.args.get('crop')
         state = request.args.get('state')
         
-        value_chain_service = ValueChainService()
+        value_chain_service = get_service('value_chain')
         listings = value_chain_service.get_market_listings(crop, state)
         
         return jsonify(listings)
@@ -104,7 +105,7 @@ def market_listings():
 @jwt_required()
 def connect_with_buyer():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -113,7 +114,7 @@ def connect_with_buyer():
     listing_id = data.get('listing_id')
     buyer_id = data.get('buyer_id')
     
-    value_chain_service = ValueChainService()
+    value_chain_service = get_service('value_chain')
     connection = value_chain_service.connect_with_buyer(listing_id, buyer_id, user)
     
     return jsonify(connection)
@@ -122,7 +123,7 @@ def connect_with_buyer():
 @jwt_required()
 def group_procurement():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -133,7 +134,7 @@ def group_procurement():
         crop = data.get('crop', 'fertilizer')
         quantity = data.get('quantity', 0)
         
-        value_chain_service = ValueChainService()
+        value_chain_service = get_service('value_chain')
         group = value_chain_service.create_group_procurement(user, crop, quantity)
         
         return jsonify(group)
@@ -142,7 +143,7 @@ def group_procurement():
         crop = request.args.get('crop')
         state = request.args.get('state')
         
-        value_chain_service = ValueChainService()
+        value_chain_service = get_service('value_chain')
         groups = value_chain_service.get_group_procurements(crop, state)
         
         return jsonify(groups)
@@ -151,7 +152,7 @@ def group_procurement():
 @jwt_required()
 def join_group():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -159,7 +160,7 @@ def join_group():
     data = request.get_json()
     group_id = data.get('group_id')
     
-    value_chain_service = ValueChainService()
+    value_chain_service = get_service('value_chain')
     result = value_chain_service.join_group_procurement(group_id, user)
     
     return jsonify(result)
\ No newline at end of file
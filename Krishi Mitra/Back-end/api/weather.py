@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, app
-from services.weather_service import WeatherService
+from models import db
+from utils.registry import get_service
+from utils.user_cache import load_user
 from datetime import datetime
 
 weather_bp = Blueprint('weather', __name__)
@@ -10,7 +11,7 @@ weather_bp = Blueprint('weather', __name__)
 @jwt_required()
 def get_current_weather():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -21,7 +22,7 @@ def get_current_weather():
     language = user.language or 'en'
     
     # Get weather data
-    weather_service = WeatherService(api_key=app.config['WEATHER_API_KEY'])
+    weather_service = get_service('weather')
     weather_data = weather_service.get_weather_data(lat, lon, language)
     
     return jsonify(weather_data)
@@ -30,7 +31,7 @@ def get_current_weather():
 @jwt_required()
 def get_weather_alerts():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -41,7 +42,7 @@ def get_weather_alerts():
     language = user.language or 'en'
     
     # Get weather data
-    weather_service = WeatherService(api_key=app.config['WEATHER_API_KEY'])
+    weather_service = get_service('weather')
     weather_data = weather_service.get_weather_data(lat, lon, language)
     
     # Return only alerts
@@ -55,7 +56,7 @@ def get_weather_alerts():
 @jwt_required()
 def get_historical_weather():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
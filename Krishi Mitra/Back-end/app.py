@@ -8,7 +8,64 @@ from api.weather import weather_bp
 from api.market import market_bp
 from api.soil import soil_bp
 from api.pest import pest_bp
+from service.market_service import MarketService, MarketPriceWarmer
+from service.price_store import PriceStore
+from service.market_ingest import MarketIngestWorker
+from utils.http_client import configure_upstream_client, get_upstream_client
+from utils.registry import ServiceRegistry
 import os
+import click
+
+def register_services(app):
+    """Build the registry of services shared by every request in this worker"""
+    registry = ServiceRegistry(app)
+    
+    registry.register(
+        'market',
+        lambda: MarketService(
+            api_key=app.config['MARKET_API_KEY'],
+            stale_while_revalidate=app.config['MARKET_STALE_WHILE_REVALIDATE']
+        ),
+        shutdown=lambda service: service.close()
+    )
+    
+    # Imported on first use so a worker only loads the services it serves
+    def agronomic_service():
+        from service.agronomic_service import AgronomicService
+        return AgronomicService()
+    
+    def value_chain_service():
+        from service.value_chain_service import ValueChainService
+        return ValueChainService()
+    
+    def weather_service():
+        from service.weather_service import WeatherService
+        return WeatherService(api_key=app.config['WEATHER_API_KEY'])
+    
+    def ml_service():
+        from service.ml_services import MLService
+        return MLService(
+            max_batch_size=app.config['ML_BATCH_SIZE'],
+            max_wait_ms=app.config['ML_BATCH_WAIT_MS'],
+            max_queue=app.config['ML_QUEUE_SIZE'],
+            request_timeout=app.config['ML_REQUEST_TIMEOUT'],
+            inference_workers=app.config['ML_INFERENCE_WORKERS'],
+            intra_op_threads=app.config['ML_INTRA_OP_THREADS'],
+            inter_op_threads=app.config['ML_INTER_OP_THREADS'],
+            backend=app.config['ML_BACKEND'],
+            model_dir=app.config['ML_MODEL_DIR']
+        )
+    
+    def nlp_service():
+        from service.nlp_service import NLPService
+        return NLPService(ml_service=registry.get('ml'))
+    
+    registry.register('agronomic', agronomic_service)
+    registry.register('value_chain', value_chain_service)
+    registry.register('weather', weather_service)
+    registry.register('ml', ml_service, shutdown=lambda service: service.close())
+    registry.register('nlp', nlp_service)
+    return registry
 
 def create_app():
     app = Flask(__name__, static_folder='../frontend')
@@ -17,6 +74,16 @@ def create_app():
     # Initialize database
     db.init_app(app)
     
+    # Shared upstream HTTP client
+    configure_upstream_client(
+        connect_timeout=app.config['UPSTREAM_CONNECT_TIMEOUT'],
+        read_timeout=app.config['UPSTREAM_READ_TIMEOUT'],
+        max_retries=app.config['UPSTREAM_MAX_RETRIES'],
+        pool_maxsize=app.config['UPSTREAM_POOL_SIZE'],
+        failure_threshold=app.config['UPSTREAM_FAILURE_THRESHOLD'],
+        reset_timeout=app.config['UPSTREAM_RESET_TIMEOUT']
+    )
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
@@ -32,6 +99,50 @@ def create_app():
     with app.app_context():
         db.create_all()
     
+    # Application-scoped services
+    registry = register_services(app)
+    if app.config['SERVICES_WARM_UP']:
+        registry.warm_up(app.config['SERVICES_WARM_UP'])
+    
+    # Keep popular market prices warm
+    if app.config['MARKET_PREWARM_ENABLED']:
+        warmer = MarketPriceWarmer(
+            app,
+            top_n=app.config['MARKET_PREWARM_TOP_N'],
+            interval=app.config['MARKET_PREWARM_INTERVAL'],
+            lead_time=app.config['MARKET_PREWARM_LEAD_TIME']
+        )
+        registry.register(
+            'market_price_warmer',
+            lambda: warmer,
+            warmup=lambda warmer: warmer.start(),
+            shutdown=lambda warmer: warmer.stop()
+        )
+        registry.warm_up(['market_price_warmer'])
+    
+    # Load mandi price dumps into the historical price store
+    @app.cli.command('ingest-prices')
+    @click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+    def ingest_prices(paths):
+        store = PriceStore()
+        for path in paths:
+            stats = store.ingest_file(path)
+            click.echo(f"{path}: {stats['inserted']} inserted, {stats['duplicates']} duplicates, {stats['rejected']} rejected")
+    
+    # Pull the configured market resource into the price store
+    @app.cli.command('ingest-market')
+    @click.option('--url', help='Override MARKET_API_URL, e.g. a local stub server')
+    @click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from offset 0')
+    def ingest_market(url, restart):
+        overrides = {'resource_url': url} if url else {}
+        stats = MarketIngestWorker.from_config(app.config, **overrides).run(restart=restart)
+        click.echo(', '.join(f"{count} {name}" for name, count in stats.items()))
+    
+    # Upstream API health
+    @app.route('/api/upstream/metrics')
+    def upstream_metrics():
+        return jsonify(get_upstream_client().metrics())
+    
     # Serve frontend
     @app.route('/')
     def index():
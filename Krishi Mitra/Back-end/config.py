@@ -19,7 +19,52 @@ class Config:
     
     # Market API Configuration
     MARKET_API_KEY = os.environ.get('MARKET_API_KEY') or 'your-market-api-key'
-    MARKET_API_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+    MARKET_API_URL = os.environ.get('MARKET_API_URL') or "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+    # Background ingestion of MARKET_API_URL into the price store
+    MARKET_INGEST_PAGE_SIZE = int(os.environ.get('MARKET_INGEST_PAGE_SIZE', 500))
+    MARKET_INGEST_CONCURRENCY = int(os.environ.get('MARKET_INGEST_CONCURRENCY', 4))
+    MARKET_INGEST_CHECKPOINT = os.environ.get('MARKET_INGEST_CHECKPOINT') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'market_ingest_checkpoint.json')
+    # Serve expired prices immediately and refresh them in the background
+    MARKET_STALE_WHILE_REVALIDATE = os.environ.get('MARKET_STALE_WHILE_REVALIDATE', 'true').lower() == 'true'
+    # Largest number of crop/state/district keys accepted by /api/market/prices/batch
+    MARKET_BATCH_MAX_ITEMS = int(os.environ.get('MARKET_BATCH_MAX_ITEMS', 50))
+    # Refresh the top-N most requested crop/state keys before they expire
+    MARKET_PREWARM_ENABLED = os.environ.get('MARKET_PREWARM_ENABLED', 'true').lower() == 'true'
+    MARKET_PREWARM_TOP_N = int(os.environ.get('MARKET_PREWARM_TOP_N', 20))
+    MARKET_PREWARM_INTERVAL = int(os.environ.get('MARKET_PREWARM_INTERVAL', 900))  # seconds
+    MARKET_PREWARM_LEAD_TIME = int(os.environ.get('MARKET_PREWARM_LEAD_TIME', 1800))  # seconds before expiry
+    
+    # Upstream HTTP client: timeouts in seconds, retries per idempotent request,
+    # and consecutive failures before a host's circuit opens
+    UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+    UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10))
+    UPSTREAM_MAX_RETRIES = int(os.environ.get('UPSTREAM_MAX_RETRIES', 2))
+    UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 10))
+    UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get('UPSTREAM_FAILURE_THRESHOLD', 5))
+    UPSTREAM_RESET_TIMEOUT = float(os.environ.get('UPSTREAM_RESET_TIMEOUT', 30))
+    
+    # Services constructed at startup rather than on their first request
+    SERVICES_WARM_UP = [name for name in os.environ.get('SERVICES_WARM_UP', 'market,agronomic').split(',') if name]
+    
+    # Image analysis micro-batching: largest batch, how long to wait for it to
+    # fill, queued requests before rejecting, and per-request deadline (seconds)
+    ML_BATCH_SIZE = int(os.environ.get('ML_BATCH_SIZE', 16))
+    ML_BATCH_WAIT_MS = float(os.environ.get('ML_BATCH_WAIT_MS', 10))
+    ML_QUEUE_SIZE = int(os.environ.get('ML_QUEUE_SIZE', 256))
+    ML_REQUEST_TIMEOUT = float(os.environ.get('ML_REQUEST_TIMEOUT', 5))
+    # Inference worker processes per web process (0 runs the models in the web
+    # process itself) and TensorFlow thread pools per worker. Every web worker
+    # starts its own pool, so a host loads the models web workers x
+    # ML_INFERENCE_WORKERS times: raise it only with few web workers, or use
+    # ML_BACKEND=tflite to make each copy small
+    ML_INFERENCE_WORKERS = int(os.environ.get('ML_INFERENCE_WORKERS', 1))
+    ML_INTRA_OP_THREADS = int(os.environ.get('ML_INTRA_OP_THREADS', 1))
+    ML_INTER_OP_THREADS = int(os.environ.get('ML_INTER_OP_THREADS', 1))
+    # 'keras' for the .h5 models, 'tflite' for the quantized exports written
+    # by `python -m service.export_tflite`
+    ML_BACKEND = os.environ.get('ML_BACKEND', 'keras')
+    ML_MODEL_DIR = os.environ.get('ML_MODEL_DIR', 'ml_models')
     
     # ML Model Path
     PEST_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml_models', 'pest_detection.h5')
\ No newline at end of file
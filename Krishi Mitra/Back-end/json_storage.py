@@ -1,14 +1,226 @@
+import atexit
+import heapq
+import io
+import itertools
 import json
 import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Hashable, Iterator, Tuple, IO
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Snapshot file extension of each supported on-disk format
+SNAPSHOT_EXTENSIONS = {
+    'json': '.json',
+    'columnar': '.jcol',
+    'msgpack': '.mpk'
+}
+
+BACKUP_MANIFEST = 'manifest.json'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Storages with a group commit window, flushed when the interpreter exits
+_group_commit_storages = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_group_commits() -> None:
+    for storage in list(_group_commit_storages):
+        storage.close()
+
+
+class ReadWriteLock:
+    """Lock allowing many concurrent readers or a single writer
+
+    Both sides are reentrant and a thread holding the write lock may also take
+    the read lock. Waiting writers block new readers so they cannot starve, and
+    a read lock cannot be upgraded to a write lock.
+    """
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._writers_waiting:
+                    self._condition.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            self._readers[me] -= 1
+            if not self._readers[me]:
+                del self._readers[me]
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    def is_writer(self) -> bool:
+        """Check whether the current thread holds the write lock"""
+        return self._writer == threading.get_ident()
+
+    def is_reader(self) -> bool:
+        """Check whether the current thread holds only a read lock"""
+        return not self.is_writer() and threading.get_ident() in self._readers
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class FileLock:
+    """Reentrant exclusive lock on a file, used to coordinate processes
+
+    Not thread-safe on its own; JSONStorage only takes it under its write lock.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+
+    def acquire(self) -> None:
+        if not self._depth:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            self._fd = fd
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if not self._depth:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+
 
 class JSONStorage:
-    def __init__(self, data_dir: str = 'data'):
+    def __init__(self, data_dir: str = 'data', journal: bool = False,
+                 compact_threshold: int = 1000, compact_interval: Optional[float] = None,
+                 indexes: Optional[Dict[str, List[str]]] = None,
+                 max_memory_bytes: Optional[int] = None, commit_window: float = 0,
+                 shared: bool = False, formats: Optional[Dict[str, str]] = None):
+        if shared and commit_window > 0:
+            raise ValueError("Group commit cannot be combined with a shared data directory")
         self.data_dir = data_dir
+        # Snapshot format per collection: pretty-printed 'json' (the default),
+        # 'columnar' compact JSON that stores field names once, or the same
+        # columnar layout encoded with msgpack
+        self.formats = {}
+        for collection_name, snapshot_format in (formats or {}).items():
+            self._check_format(snapshot_format)
+            self.formats[collection_name] = snapshot_format
+        # Journal mode appends one compact record per mutation to <collection>.log
+        # and only rewrites the full snapshot when the collection is compacted
+        self.journal = journal
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
         self.ensure_data_dir()
-        self.collections = {}
-        self.load_all_collections()
+        # Each collection is an insertion-ordered dict keyed by document id, which
+        # doubles as the primary-key index. Collections are loaded on first access
+        # and kept in least-recently-used order for eviction
+        self.collections = OrderedDict()
+        # Memory budget in approximate serialized bytes, None keeps everything loaded
+        self.max_memory_bytes = max_memory_bytes
+        self.collection_sizes = {}
+        # Incrementally maintained statistics: per-field value counts of loaded
+        # collections, modification times, and the last stats of unloaded ones
+        self.field_counts = {}
+        self.last_modified = {}
+        self.stats_cache = {}
+        # Collections whose snapshot on disk is behind their journal
+        self.dirty = set()
+        # Secondary hash indexes: collection -> field -> value -> {key: document}
+        self.index_fields = {name: list(fields) for name, fields in (indexes or {}).items()}
+        self.indexes = {}
+        self._synthetic_keys = itertools.count()
+        self.log_counts = {}
+        self.last_compaction = {}
+        # Group commit: mutations arriving within commit_window seconds are made
+        # durable by a single flush. A window of 0 flushes every mutation before
+        # the call returns. With a window, writes are acknowledged before they
+        # reach disk: a crash or kill within the window loses them. Queued writes
+        # are flushed by close() and on normal interpreter exit
+        self.commit_window = commit_window
+        self.pending = {}
+        self._flush_timer = None
+        if commit_window > 0:
+            _group_commit_storages.add(self)
+        # Readers run concurrently, mutations, loads and evictions are serialized
+        self._lock = ReadWriteLock()
+        # Shared mode lets several processes use one data directory: writers hold
+        # an exclusive file lock, and every access first picks up changes made by
+        # other processes from the snapshot signature and journal length on disk
+        self.shared = shared
+        self._file_lock = FileLock(os.path.join(data_dir, '.lock'))
+        self.snapshot_signatures = {}
+        self.log_offsets = {}
 
     def ensure_data_dir(self):
         """Create data directory if it doesn't exist"""
@@ -17,110 +229,818 @@ class JSONStorage:
 
     def get_collection_path(self, collection_name: str) -> str:
         """Get file path for a collection"""
-        return os.path.join(self.data_dir, f"{collection_name}.json")
+        extension = SNAPSHOT_EXTENSIONS[self.formats.get(collection_name, 'json')]
+        return os.path.join(self.data_dir, f"{collection_name}{extension}")
 
-    def load_collection(self, collection_name: str) -> List[Dict]:
-        """Load a collection from JSON file"""
-        file_path = self.get_collection_path(collection_name)
-        if os.path.exists(file_path):
+    def _snapshot_paths(self, collection_name: str) -> List[str]:
+        """Get the snapshot paths of every format, the configured one first"""
+        configured = self.get_collection_path(collection_name)
+        others = [os.path.join(self.data_dir, f"{collection_name}{extension}")
+                  for extension in SNAPSHOT_EXTENSIONS.values()]
+        return [configured] + [path for path in others if path != configured]
+
+    def _check_format(self, snapshot_format: str) -> None:
+        """Validate a snapshot format name"""
+        if snapshot_format not in SNAPSHOT_EXTENSIONS:
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        if snapshot_format == 'msgpack' and msgpack is None:
+            raise ValueError("The msgpack snapshot format requires the msgpack package")
+
+    def set_format(self, collection_name: str, snapshot_format: str) -> None:
+        """Change a collection's snapshot format and rewrite its snapshot"""
+        self._check_format(snapshot_format)
+        with self._writing(collection_name):
+            self.formats[collection_name] = snapshot_format
+            if collection_name in self.collections or self._exists_on_disk(collection_name):
+                self.compact(collection_name)
+
+    def _encode_columnar(self, data: List[Dict]) -> Dict:
+        """Store the most common field layout once and its documents as value rows
+
+        Documents with any other layout are kept whole, so decoding is lossless
+        and preserves both document order and key order.
+        """
+        layouts = Counter(tuple(document) for document in data)
+        columns = list(layouts.most_common(1)[0][0]) if layouts else []
+        layout = tuple(columns)
+        rows = [[document[column] for column in columns] if tuple(document) == layout else document
+                for document in data]
+        return {'format': 'columnar', 'columns': columns, 'rows': rows}
+
+    def _decode_columnar(self, snapshot: Dict) -> List[Dict]:
+        """Rebuild documents from a columnar snapshot"""
+        columns = snapshot['columns']
+        return [dict(zip(columns, row)) if isinstance(row, list) else row for row in snapshot['rows']]
+
+    def _read_snapshot(self, file_path: str) -> List[Dict]:
+        """Read a snapshot in whichever format its extension names"""
+        if file_path.endswith(SNAPSHOT_EXTENSIONS['json']):
             with open(file_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        return []
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        if file_path.endswith(SNAPSHOT_EXTENSIONS['msgpack']):
+            if msgpack is None:
+                raise ValueError(f"Reading {file_path} requires the msgpack package")
+            return self._decode_columnar(msgpack.unpackb(raw, raw=False, strict_map_key=False))
+        return self._decode_columnar(json.loads(raw))
+
+    def get_log_path(self, collection_name: str) -> str:
+        """Get journal file path for a collection"""
+        return os.path.join(self.data_dir, f"{collection_name}.log")
+
+    @contextmanager
+    def _writing(self, collection_name: Optional[str] = None):
+        """Hold the write lock, and in shared mode the file lock, with the collection up to date"""
+        with self._lock.write_locked():
+            if self.shared:
+                self._file_lock.acquire()
+            try:
+                if self.shared and collection_name in self.collections and self._changed_on_disk(collection_name):
+                    self._sync_collection(collection_name)
+                yield
+            finally:
+                if self.shared:
+                    self._file_lock.release()
+
+    @contextmanager
+    def _reading(self, collection_name: str):
+        """Hold the read lock with the collection loaded and up to date"""
+        # A thread that already holds a read lock cannot load, it sees what is loaded
+        nested = self._lock.is_reader()
+        while True:
+            if not nested and self._needs_load(collection_name):
+                with self._writing(collection_name):
+                    self._get_collection(collection_name)
+            self._lock.acquire_read()
+            # An eviction may have slipped in between the two locks
+            if nested or self._lock.is_writer() or collection_name in self.collections \
+                    or not self._exists_on_disk(collection_name):
+                break
+            self._lock.release_read()
+        try:
+            yield
+        finally:
+            self._lock.release_read()
+
+    def _exists_on_disk(self, collection_name: str) -> bool:
+        """Check whether a collection has a snapshot or journal on disk"""
+        return any(os.path.exists(path) for path in self._snapshot_paths(collection_name)) or \
+            os.path.exists(self.get_log_path(collection_name))
+
+    def _needs_load(self, collection_name: str) -> bool:
+        """Check whether a collection must be loaded or resynchronized before reading"""
+        if collection_name in self.collections:
+            return self.shared and self._changed_on_disk(collection_name)
+        return self._exists_on_disk(collection_name)
+
+    def _snapshot_signature(self, collection_name: str) -> Optional[tuple]:
+        """Identify the snapshot file currently on disk"""
+        try:
+            stat = os.stat(self.get_collection_path(collection_name))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _changed_on_disk(self, collection_name: str) -> bool:
+        """Check whether another process wrote to a loaded collection"""
+        if self._snapshot_signature(collection_name) != self.snapshot_signatures.get(collection_name):
+            return True
+        log_path = self.get_log_path(collection_name)
+        log_size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+        return log_size != self.log_offsets.get(collection_name, 0)
+
+    def _sync_collection(self, collection_name: str) -> None:
+        """Pick up another process's changes, replaying only the journal tail when possible"""
+        if self._snapshot_signature(collection_name) != self.snapshot_signatures.get(collection_name):
+            self.load_collection(collection_name)
+            return
+        start = self.log_offsets.get(collection_name, 0)
+        count = self._replay_log(collection_name, start)
+        if count:
+            self.log_counts[collection_name] = self.log_counts.get(collection_name, 0) + count
+            self.dirty.add(collection_name)
+            self._track_size(collection_name, self.log_offsets[collection_name] - start)
+
+    def load_collection(self, collection_name: str) -> List[Dict]:
+        """Load a collection from its JSON snapshot and replay its journal"""
+        with self._writing():
+            return self._load_collection(collection_name)
+
+    def _load_collection(self, collection_name: str) -> List[Dict]:
+        # A snapshot in another format is read until the next save migrates it
+        file_path = next((path for path in self._snapshot_paths(collection_name) if os.path.exists(path)),
+                         self.get_collection_path(collection_name))
+        documents = []
+        size = 0
+        self.snapshot_signatures[collection_name] = self._snapshot_signature(collection_name)
+        if os.path.exists(file_path):
+            documents = self._read_snapshot(file_path)
+            size += os.path.getsize(file_path)
+        self._build_collection(collection_name, documents)
+        self.log_counts[collection_name] = self._replay_log(collection_name)
+        if self.log_counts[collection_name]:
+            self.dirty.add(collection_name)
+        size += self.log_offsets[collection_name]
+        self.collection_sizes[collection_name] = size
+        self.last_modified.setdefault(collection_name, max(
+            (os.path.getmtime(path) for path in (file_path, self.get_log_path(collection_name))
+             if os.path.exists(path)),
+            default=time.time()
+        ))
+        self.stats_cache.pop(collection_name, None)
+        self.last_compaction[collection_name] = time.time()
+        self._evict(keep=collection_name)
+        return self.find_all(collection_name)
 
     def save_collection(self, collection_name: str, data: List[Dict]) -> None:
-        """Save a collection to JSON file"""
+        """Atomically save a collection in its snapshot format"""
+        snapshot_format = self.formats.get(collection_name, 'json')
         file_path = self.get_collection_path(collection_name)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{collection_name}.", suffix='.tmp', dir=self.data_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if snapshot_format == 'json':
+                    f.write(json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'))
+                elif snapshot_format == 'msgpack':
+                    f.write(msgpack.packb(self._encode_columnar(data), use_bin_type=True))
+                else:
+                    f.write(json.dumps(self._encode_columnar(data), ensure_ascii=False,
+                                       separators=(',', ':')).encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        # Drop a snapshot left over from the collection's previous format
+        for path in self._snapshot_paths(collection_name)[1:]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._fsync_data_dir()
+        self.snapshot_signatures[collection_name] = self._snapshot_signature(collection_name)
 
-    def load_all_collections(self):
-        """Load all collections from data directory"""
+    def _fsync_data_dir(self) -> None:
+        """Make renames and removals in the data directory durable"""
+        if os.name != 'posix':
+            return
+        fd = os.open(self.data_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def list_collections(self) -> List[str]:
+        """Get the names of all collections, loaded or still on disk"""
+        names = list(self.collections)
         if os.path.exists(self.data_dir):
-            for file_name in os.listdir(self.data_dir):
-                if file_name.endswith('.json'):
-                    collection_name = file_name[:-5]  # Remove .json extension
-                    self.collections[collection_name] = self.load_collection(collection_name)
+            for file_name in sorted(os.listdir(self.data_dir)):
+                collection_name, extension = os.path.splitext(file_name)
+                if extension in SNAPSHOT_EXTENSIONS.values() or extension == '.log':
+                    if collection_name not in names:
+                        names.append(collection_name)
+        return names
+
+    def load_all_collections(self):
+        """Eagerly load all collections from data directory"""
+        with self._writing():
+            for collection_name in self.list_collections():
+                if collection_name not in self.collections:
+                    self._load_collection(collection_name)
+
+    def _get_collection(self, collection_name: str, create: bool = False) -> Optional[Dict]:
+        """Get a loaded collection, loading it from disk on first access"""
+        if collection_name in self.collections:
+            self.collections.move_to_end(collection_name)
+        elif not self._lock.is_writer():
+            # Readers only see loaded collections, _reading loads them beforehand
+            return None
+        elif self._exists_on_disk(collection_name):
+            self._load_collection(collection_name)
+        elif create:
+            self._build_collection(collection_name, [])
+            self.collection_sizes[collection_name] = 0
+            self.last_modified[collection_name] = time.time()
+        else:
+            return None
+        return self.collections[collection_name]
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Unload least recently used collections until the memory budget is met"""
+        if self.max_memory_bytes is None:
+            return
+        for name in list(self.collections):
+            if sum(self.collection_sizes.get(n, 0) for n in self.collections) <= self.max_memory_bytes:
+                break
+            if name == keep:
+                continue
+            self.unload_collection(name)
+
+    def unload_collection(self, collection_name: str) -> None:
+        """Flush a collection if needed and drop it from memory"""
+        with self._writing():
+            if collection_name not in self.collections:
+                return
+            self._flush_collection(collection_name)
+            if collection_name in self.dirty:
+                self.compact(collection_name)
+            stats = self.get_collection_stats(collection_name)
+            self._discard_collection(collection_name)
+            self.stats_cache[collection_name] = stats
+
+    def _discard_collection(self, collection_name: str) -> None:
+        """Forget everything held in memory about a collection, leaving its files alone"""
+        self.collections.pop(collection_name, None)
+        self.pending.pop(collection_name, None)
+        self.indexes.pop(collection_name, None)
+        self.collection_sizes.pop(collection_name, None)
+        self.field_counts.pop(collection_name, None)
+        self.last_modified.pop(collection_name, None)
+        self.stats_cache.pop(collection_name, None)
+        self.dirty.discard(collection_name)
+        self.log_counts.pop(collection_name, None)
+        self.last_compaction.pop(collection_name, None)
+        self.snapshot_signatures.pop(collection_name, None)
+        self.log_offsets.pop(collection_name, None)
+
+    def _document_size(self, document: Dict) -> int:
+        """Approximate the serialized size of a document"""
+        return len(json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def _track_size(self, collection_name: str, delta: int) -> None:
+        """Adjust a collection's memory estimate and enforce the budget"""
+        self.collection_sizes[collection_name] = self.collection_sizes.get(collection_name, 0) + delta
+        self.last_modified[collection_name] = time.time()
+        self._evict(keep=collection_name)
+
+    def _replay_log(self, collection_name: str, start: int = 0) -> int:
+        """Apply journal records from a byte offset onwards, returns the record count"""
+        log_path = self.get_log_path(collection_name)
+        self.log_offsets[collection_name] = start
+        if not os.path.exists(log_path):
+            self.log_offsets[collection_name] = 0
+            return 0
+
+        count = 0
+        offset = start
+        with open(log_path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("Incomplete journal record")
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn record can only be the last one written before a crash
+                    break
+                self._apply_record(collection_name, record)
+                count += 1
+                offset += len(line)
+        if offset < os.path.getsize(log_path):
+            # Cut the torn tail so later appends start on a clean line
+            with open(log_path, 'r+b') as f:
+                f.truncate(offset)
+        self.log_offsets[collection_name] = offset
+        return count
+
+    def _apply_record(self, collection_name: str, record: Dict) -> None:
+        """Apply a single journal record to an in-memory collection"""
+        op = record['op']
+        if op == 'insert':
+            # Replaying an insert that is already in the snapshot must not duplicate it,
+            # which happens when a crash lands between a compaction's rename and log removal
+            doc_id = record['doc'].get('id')
+            if doc_id in self.collections[collection_name]:
+                self._replace_document(collection_name, doc_id, record['doc'])
+            else:
+                self._add_document(collection_name, record['doc'])
+        elif op == 'update':
+            if record['id'] in self.collections[collection_name]:
+                self._replace_document(collection_name, record['id'], record['doc'])
+        elif op == 'delete':
+            if record['id'] in self.collections[collection_name]:
+                self._remove_document(collection_name, record['id'])
+        elif op == 'update_many':
+            collection = self.collections[collection_name]
+            for key in self._find_keys(collection_name, record['query']):
+                if record.get('unkeyed') and not self._is_synthetic_key(key):
+                    continue
+                updated = {**collection[key], **record['updates'], 'updatedAt': record['updatedAt']}
+                self._replace_document(collection_name, key, updated)
+        elif op == 'delete_many':
+            for key in self._find_keys(collection_name, record['query']):
+                if record.get('unkeyed') and not self._is_synthetic_key(key):
+                    continue
+                self._remove_document(collection_name, key)
+
+    def _persist(self, collection_name: str, records: List[Dict]) -> None:
+        """Persist mutations now, or queue them for the next group commit"""
+        pending = self.pending.setdefault(collection_name, [])
+        if self.journal:
+            pending.extend(records)
+        if self.commit_window <= 0:
+            self._flush_collection(collection_name)
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.commit_window, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_collection(self, collection_name: str) -> None:
+        """Write a collection's queued mutations as journal records or as a full snapshot"""
+        records = self.pending.pop(collection_name, None)
+        if records is None:
+            return
+        if not self.journal:
+            if collection_name in self.dirty:
+                # A journal written in journal mode was replayed on load, it must go
+                # with this rewrite or it would be replayed over newer data later
+                self.compact(collection_name)
+            else:
+                self.save_collection(collection_name, list(self.collections[collection_name].values()))
+            return
+
+        with open(self.get_log_path(collection_name), 'ab') as f:
+            f.write(''.join(
+                json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+                for record in records
+            ).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            self.log_offsets[collection_name] = f.tell()
+        self.log_counts[collection_name] = self.log_counts.get(collection_name, 0) + len(records)
+        self.dirty.add(collection_name)
+
+        if self._should_compact(collection_name):
+            self.compact(collection_name)
+
+    def flush(self) -> None:
+        """Durably write every queued mutation"""
+        with self._writing():
+            self._flush_timer = None
+            for collection_name in list(self.pending):
+                self._flush_collection(collection_name)
+
+    def close(self) -> None:
+        """Stop the group commit timer and flush queued mutations"""
+        with self._writing():
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            self.flush()
+
+    def _should_compact(self, collection_name: str) -> bool:
+        """Check whether the journal has outgrown its size or age limit"""
+        if self.log_counts.get(collection_name, 0) >= self.compact_threshold:
+            return True
+        if self.compact_interval is not None:
+            last = self.last_compaction.get(collection_name, 0)
+            return time.time() - last >= self.compact_interval
+        return False
+
+    def compact(self, collection_name: Optional[str] = None) -> None:
+        """Rewrite the snapshot and truncate the journal for one or all collections"""
+        with self._writing(collection_name):
+            names = [collection_name] if collection_name else list(self.collections)
+            for name in names:
+                # The snapshot supersedes anything still queued for the journal
+                self.pending.pop(name, None)
+                self.save_collection(name, self.find_all(name))
+                log_path = self.get_log_path(name)
+                if os.path.exists(log_path):
+                    os.remove(log_path)
+                    self._fsync_data_dir()
+                self.log_counts[name] = 0
+                self.log_offsets[name] = 0
+                self.last_compaction[name] = time.time()
+                self.dirty.discard(name)
+
+    def _is_hashable(self, value: Any) -> bool:
+        """Check whether a value can be used as an index key"""
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        return True
+
+    def _document_key(self, collection: Dict, document: Dict) -> Hashable:
+        """Key a document by its id, or by a private key when the id is missing or taken"""
+        doc_id = document.get('id')
+        if doc_id is not None and self._is_hashable(doc_id) and doc_id not in collection:
+            return doc_id
+        return ('_', next(self._synthetic_keys))
+
+    def _is_synthetic_key(self, key: Hashable) -> bool:
+        """Check whether a document is stored under a private key rather than its id"""
+        return isinstance(key, tuple)
+
+    def _build_collection(self, collection_name: str, documents: List[Dict]) -> None:
+        """Replace a collection's contents and rebuild its indexes"""
+        self.collections[collection_name] = {}
+        self.collections.move_to_end(collection_name)
+        self.indexes[collection_name] = {field: {} for field in self.index_fields.get(collection_name, [])}
+        self.field_counts[collection_name] = {}
+        for document in documents:
+            self._add_document(collection_name, document)
+
+    def _index_document(self, collection_name: str, key: Hashable, document: Dict) -> None:
+        """Add a document to every secondary index of its collection"""
+        for field, index in self.indexes.get(collection_name, {}).items():
+            value = document.get(field)
+            if self._is_hashable(value):
+                index.setdefault(value, {})[key] = document
+
+    def _unindex_document(self, collection_name: str, key: Hashable, document: Dict) -> None:
+        """Remove a document from every secondary index of its collection"""
+        for field, index in self.indexes.get(collection_name, {}).items():
+            value = document.get(field)
+            if self._is_hashable(value) and value in index:
+                bucket = index[value]
+                bucket.pop(key, None)
+                if not bucket:
+                    del index[value]
+
+    def _count_fields(self, collection_name: str, document: Dict, delta: int) -> None:
+        """Add or remove a document's field values from the cardinality counters"""
+        field_counts = self.field_counts[collection_name]
+        for field, value in document.items():
+            if not self._is_hashable(value):
+                value = json.dumps(value, sort_keys=True)
+            counts = field_counts.setdefault(field, {})
+            count = counts.get(value, 0) + delta
+            if count > 0:
+                counts[value] = count
+            else:
+                counts.pop(value, None)
+                if not counts:
+                    del field_counts[field]
+
+    def _add_document(self, collection_name: str, document: Dict) -> Hashable:
+        """Store a document and index it, returns its key"""
+        collection = self.collections[collection_name]
+        key = self._document_key(collection, document)
+        collection[key] = document
+        self._index_document(collection_name, key, document)
+        self._count_fields(collection_name, document, 1)
+        return key
+
+    def _replace_document(self, collection_name: str, key: Hashable, document: Dict) -> None:
+        """Swap the document stored under a key, keeping its position"""
+        collection = self.collections[collection_name]
+        self._unindex_document(collection_name, key, collection[key])
+        self._count_fields(collection_name, collection[key], -1)
+        collection[key] = document
+        self._index_document(collection_name, key, document)
+        self._count_fields(collection_name, document, 1)
+
+    def _remove_document(self, collection_name: str, key: Hashable) -> Dict:
+        """Remove a document from a collection and its indexes"""
+        document = self.collections[collection_name].pop(key)
+        self._unindex_document(collection_name, key, document)
+        self._count_fields(collection_name, document, -1)
+        return document
+
+    def create_index(self, collection_name: str, field: str) -> None:
+        """Declare a hash index on a field and build it from existing documents"""
+        with self._writing(collection_name):
+            fields = self.index_fields.setdefault(collection_name, [])
+            if field not in fields:
+                fields.append(field)
+            if collection_name in self.collections:
+                index = self.indexes[collection_name][field] = {}
+                for key, document in self.collections[collection_name].items():
+                    value = document.get(field)
+                    if self._is_hashable(value):
+                        index.setdefault(value, {})[key] = document
+
+    def drop_index(self, collection_name: str, field: str) -> None:
+        """Remove a secondary index"""
+        with self._writing(collection_name):
+            if field in self.index_fields.get(collection_name, []):
+                self.index_fields[collection_name].remove(field)
+            self.indexes.get(collection_name, {}).pop(field, None)
+
+    def _matches(self, doc: Dict, query: Dict) -> bool:
+        """Check whether a document matches every key of a query"""
+        for key, value in query.items():
+            if doc.get(key) != value:
+                return False
+        return True
+
+    def _find_keys(self, collection_name: str, query: Dict) -> List[Hashable]:
+        """Get the keys of matching documents, narrowing the scan with indexes when possible"""
+        return [key for key, _ in self._iter_matches(collection_name, query)]
+
+    def _iter_matches(self, collection_name: str, query: Dict) -> Iterator[Tuple[Hashable, Dict]]:
+        """Lazily yield matching (key, document) pairs from the smallest usable index"""
+        collection = self._get_collection(collection_name) or {}
+        candidates = collection
+        doc_id = query.get('id')
+        if doc_id is not None and self._is_hashable(doc_id):
+            document = collection.get(doc_id)
+            candidates = {doc_id: document} if document is not None and document.get('id') == doc_id else {}
+        else:
+            indexes = self.indexes.get(collection_name, {})
+            for field, value in query.items():
+                if field in indexes and self._is_hashable(value):
+                    bucket = indexes[field].get(value, {})
+                    if len(bucket) < len(candidates):
+                        candidates = bucket
+        return ((key, document) for key, document in candidates.items() if self._matches(document, query))
 
     def find_all(self, collection_name: str) -> List[Dict]:
         """Get all documents in a collection"""
-        return self.collections.get(collection_name, [])
+        with self._reading(collection_name):
+            return list((self._get_collection(collection_name) or {}).values())
 
     def find_by_id(self, collection_name: str, doc_id: str) -> Optional[Dict]:
         """Find a document by ID"""
-        collection = self.collections.get(collection_name, [])
-        for doc in collection:
-            if doc.get('id') == doc_id:
-                return doc
+        with self._reading(collection_name):
+            document = (self._get_collection(collection_name) or {}).get(doc_id)
+        if document is not None and document.get('id') == doc_id:
+            return document
         return None
 
     def find(self, collection_name: str, query: Dict) -> List[Dict]:
         """Find documents matching query"""
-        collection = self.collections.get(collection_name, [])
+        with self._reading(collection_name):
+            collection = self._get_collection(collection_name) or {}
+            return [collection[key] for key in self._find_keys(collection_name, query)]
+
+    def count_documents(self, collection_name: str, query: Optional[Dict] = None) -> int:
+        """Count documents matching query without building a result list"""
+        with self._reading(collection_name):
+            if not query:
+                return len(self._get_collection(collection_name) or {})
+            return sum(1 for _ in self._iter_matches(collection_name, query))
+
+    def _sort_key(self, field: str, descending: bool = False):
+        """Build a sort key that orders missing values last and never compares across types"""
+        def key(document: Dict) -> tuple:
+            value = document.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                # ints and floats compare with each other, so they sort as one group
+                kind = 'number'
+            else:
+                kind = type(value).__name__
+            return ((value is None) != descending, kind, value)
+        return key
+
+    def find_iter(self, collection_name: str, query: Optional[Dict] = None, skip: int = 0,
+                  limit: Optional[int] = None, sort: Optional[str] = None, descending: bool = False,
+                  projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Lazily iterate over a page of documents matching query
+
+        Nothing is evaluated until the first item is requested. Without sort the
+        scan stops as soon as skip + limit matches were seen, with sort only the
+        top skip + limit documents are kept. projection restricts each returned
+        document to the listed fields.
+        """
+        query = query or {}
+        with self._reading(collection_name):
+            documents = (document for _, document in self._iter_matches(collection_name, query))
+            end = skip + limit if limit is not None else None
+            if sort is None:
+                page = list(itertools.islice(documents, skip, end))
+            else:
+                key = self._sort_key(sort, descending)
+                if end is None:
+                    ordered = sorted(documents, key=key, reverse=descending)
+                elif descending:
+                    ordered = heapq.nlargest(end, documents, key=key)
+                else:
+                    ordered = heapq.nsmallest(end, documents, key=key)
+                page = ordered[skip:]
+
+        # Yield outside the lock so a slow consumer never blocks writers
+        for document in page:
+            if projection is not None:
+                yield {field: document[field] for field in projection if field in document}
+            else:
+                yield document
+
+    def _insert_document(self, collection_name: str, document: Dict, records: List[Dict]) -> Dict:
+        """Add metadata to a new document and store it"""
+        document['id'] = self.generate_id()
+        document['createdAt'] = datetime.now().isoformat()
+
+        self._add_document(collection_name, document)
+        records.append({'op': 'insert', 'doc': document})
+        self._track_size(collection_name, self._document_size(document))
+        return document
+
+    def _check_updates(self, updates: Dict) -> None:
+        """Reject updates that would change a document's id
+
+        Documents are stored and indexed under their id, so changing it in
+        place would leave them unreachable by the new id.
+        """
+        if 'id' in updates:
+            raise ValueError("Updates cannot change a document's id")
+
+    def _update_document(self, collection_name: str, doc_id: str, updates: Dict,
+                         records: List[Dict]) -> Optional[Dict]:
+        """Merge updates into a document by ID"""
+        self._check_updates(updates)
+        doc = self.find_by_id(collection_name, doc_id)
+        if doc is None:
+            return None
+
+        updated = {**doc, **updates}
+        updated['updatedAt'] = datetime.now().isoformat()
+        self._replace_document(collection_name, doc_id, updated)
+        records.append({'op': 'update', 'id': doc_id, 'doc': updated})
+        self._track_size(collection_name, self._document_size(updated) - self._document_size(doc))
+        return updated
+
+    def _delete_document(self, collection_name: str, doc_id: str, records: List[Dict]) -> bool:
+        """Remove a document by ID"""
+        doc = self.find_by_id(collection_name, doc_id)
+        if doc is None:
+            return False
+        self._remove_document(collection_name, doc_id)
+        records.append({'op': 'delete', 'id': doc_id})
+        self._track_size(collection_name, -self._document_size(doc))
+        return True
+
+    def _update_matching(self, collection_name: str, query: Dict, updates: Dict,
+                         records: List[Dict], updated_at: Optional[str] = None) -> List[Dict]:
+        """Merge updates into every document matching query"""
+        self._check_updates(updates)
+        updated_at = updated_at or datetime.now().isoformat()
+        collection = self._get_collection(collection_name) or {}
         results = []
-        for doc in collection:
-            match = True
-            for key, value in query.items():
-                if doc.get(key) != value:
-                    match = False
-                    break
-            if match:
-                results.append(doc)
+        size_delta = 0
+        unkeyed = False
+        for key in self._find_keys(collection_name, query):
+            doc = collection[key]
+            updated = {**doc, **updates, 'updatedAt': updated_at}
+            self._replace_document(collection_name, key, updated)
+            size_delta += self._document_size(updated) - self._document_size(doc)
+            results.append(updated)
+            # Journal the resolved documents: re-running the query on replay is
+            # wrong once a compaction's snapshot already holds later changes
+            if self._is_synthetic_key(key):
+                unkeyed = True
+            else:
+                records.append({'op': 'update', 'id': key, 'doc': updated})
+        if unkeyed:
+            # Documents without a usable id can only be found again by the query
+            records.append({'op': 'update_many', 'query': query, 'updates': updates, 'updatedAt': updated_at,
+                            'unkeyed': True})
+        if results:
+            self._track_size(collection_name, size_delta)
         return results
 
+    def _delete_matching(self, collection_name: str, query: Dict, records: List[Dict]) -> int:
+        """Remove every document matching query"""
+        keys = self._find_keys(collection_name, query)
+        removed = [self._remove_document(collection_name, key) for key in keys]
+        records.extend({'op': 'delete', 'id': key} for key in keys if not self._is_synthetic_key(key))
+        if any(self._is_synthetic_key(key) for key in keys):
+            records.append({'op': 'delete_many', 'query': query, 'unkeyed': True})
+        if keys:
+            self._track_size(collection_name, -sum(self._document_size(doc) for doc in removed))
+        return len(keys)
+
     def insert_one(self, collection_name: str, document: Dict) -> Dict:
         """Insert a document into a collection"""
-        if collection_name not in self.collections:
-            self.collections[collection_name] = []
-        
-        # Add metadata
-        document['id'] = self.generate_id()
-        document['createdAt'] = datetime.now().isoformat()
-        
-        self.collections[collection_name].append(document)
-        self.save_collection(collection_name, self.collections[collection_name])
-        return document
+        with self._writing(collection_name):
+            self._get_collection(collection_name, create=True)
+            records = []
+            result = self._insert_document(collection_name, document, records)
+            self._persist(collection_name, records)
+        return result
+
+    def insert_many(self, collection_name: str, documents: List[Dict]) -> List[Dict]:
+        """Insert several documents and persist them once"""
+        with self._writing(collection_name):
+            self._get_collection(collection_name, create=True)
+            records = []
+            results = [self._insert_document(collection_name, document, records) for document in documents]
+            if records:
+                self._persist(collection_name, records)
+        return results
 
     def update_one(self, collection_name: str, doc_id: str, updates: Dict) -> Optional[Dict]:
         """Update a document by ID"""
-        collection = self.collections.get(collection_name, [])
-        for i, doc in enumerate(collection):
-            if doc.get('id') == doc_id:
-                # Update document
-                collection[i] = {**doc, **updates}
-                collection[i]['updatedAt'] = datetime.now().isoformat()
-                self.save_collection(collection_name, collection)
-                return collection[i]
-        return None
+        with self._writing(collection_name):
+            records = []
+            result = self._update_document(collection_name, doc_id, updates, records)
+            if records:
+                self._persist(collection_name, records)
+        return result
+
+    def update_many(self, collection_name: str, query: Dict, updates: Dict) -> List[Dict]:
+        """Update every document matching query and persist once"""
+        with self._writing(collection_name):
+            records = []
+            results = self._update_matching(collection_name, query, updates, records)
+            if records:
+                self._persist(collection_name, records)
+        return results
 
     def delete_one(self, collection_name: str, doc_id: str) -> bool:
         """Delete a document by ID"""
-        collection = self.collections.get(collection_name, [])
-        for i, doc in enumerate(collection):
-            if doc.get('id') == doc_id:
-                del collection[i]
-                self.save_collection(collection_name, collection)
-                return True
-        return False
+        with self._writing(collection_name):
+            records = []
+            result = self._delete_document(collection_name, doc_id, records)
+            if records:
+                self._persist(collection_name, records)
+        return result
 
     def delete_many(self, collection_name: str, query: Dict) -> int:
         """Delete multiple documents matching query"""
-        collection = self.collections.get(collection_name, [])
-        original_length = len(collection)
-        self.collections[collection_name] = [doc for doc in collection if not all(
-            doc.get(key) == value for key, value in query.items()
-        )]
-        deleted_count = original_length - len(self.collections[collection_name])
-        if deleted_count > 0:
-            self.save_collection(collection_name, self.collections[collection_name])
-        return deleted_count
+        with self._writing(collection_name):
+            records = []
+            result = self._delete_matching(collection_name, query, records)
+            if records:
+                self._persist(collection_name, records)
+        return result
+
+    def bulk_write(self, collection_name: str, operations: List[Dict]) -> List[Any]:
+        """Apply an ordered list of operations in memory and persist them once
+
+        Each operation is a single-key dict such as
+        {'insert_one': {'document': {...}}}, {'update_one': {'id': ..., 'updates': {...}}},
+        {'delete_one': {'id': ...}}, {'update_many': {'query': {...}, 'updates': {...}}} or
+        {'delete_many': {'query': {...}}}. Returns the result of each operation in order,
+        as the matching single-operation method would have returned it.
+        """
+        handlers = {
+            'insert_one': lambda args, records: self._insert_document(collection_name, args['document'], records),
+            'update_one': lambda args, records: self._update_document(collection_name, args['id'], args['updates'], records),
+            'delete_one': lambda args, records: self._delete_document(collection_name, args['id'], records),
+            'update_many': lambda args, records: self._update_matching(collection_name, args['query'], args['updates'], records),
+            'delete_many': lambda args, records: self._delete_matching(collection_name, args['query'], records),
+        }
+        for operation in operations:
+            if len(operation) != 1 or next(iter(operation)) not in handlers:
+                raise ValueError(f"Invalid bulk operation: {operation}")
+            (name, args), = operation.items()
+            if 'updates' in args:
+                self._check_updates(args['updates'])
+
+        with self._writing(collection_name):
+            self._get_collection(collection_name, create=True)
+            records = []
+            results = []
+            try:
+                for operation in operations:
+                    (name, args), = operation.items()
+                    results.append(handlers[name](args, records))
+            finally:
+                # Operations applied before a failure are kept, as with single-document calls
+                if records:
+                    self._persist(collection_name, records)
+        return results
 
     def drop_collection(self, collection_name: str) -> None:
         """Drop a collection"""
-        if collection_name in self.collections:
-            del self.collections[collection_name]
-            file_path = self.get_collection_path(collection_name)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        with self._writing():
+            self._discard_collection(collection_name)
+            for file_path in self._snapshot_paths(collection_name) + [self.get_log_path(collection_name)]:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
 
     def generate_id(self) -> str:
         """Generate a unique ID"""
@@ -128,33 +1048,210 @@ class JSONStorage:
         return str(uuid.uuid4())
 
     def get_collection_stats(self, collection_name: str) -> Dict:
-        """Get statistics for a collection"""
-        collection = self.collections.get(collection_name, [])
+        """Get incrementally maintained statistics for a collection
+
+        size is the approximate serialized size in bytes and fields maps each
+        top-level field to its number of distinct values. Stats of a collection
+        that was unloaded are served from the values recorded at eviction.
+        """
+        if collection_name not in self.collections and collection_name in self.stats_cache:
+            return dict(self.stats_cache[collection_name])
+
+        with self._reading(collection_name):
+            collection = self._get_collection(collection_name) or {}
+            last_modified = self.last_modified.get(collection_name)
+            return {
+                'count': len(collection),
+                'size': self.collection_sizes.get(collection_name, 0),
+                'fields': {field: len(counts) for field, counts in self.field_counts.get(collection_name, {}).items()},
+                'lastModified': datetime.fromtimestamp(last_modified).isoformat() if last_modified else None
+            }
+
+    def get_storage_stats(self) -> Dict:
+        """Get statistics for every collection known to this process without loading any"""
+        collections = dict(self.stats_cache)
+        for collection_name in list(self.collections):
+            collections[collection_name] = self.get_collection_stats(collection_name)
         return {
-            'count': len(collection),
-            'size': len(json.dumps(collection).encode('utf-8'))
+            'collections': collections,
+            'loaded': len(self.collections),
+            'memoryBytes': sum(self.collection_sizes.get(name, 0) for name in self.collections),
+            'maxMemoryBytes': self.max_memory_bytes
         }
 
-    def backup(self, backup_dir: str) -> None:
-        """Backup all collections to a directory"""
+    def _pin_file(self, file_path: str) -> Optional[IO[bytes]]:
+        """Open a file so its current contents stay readable after it is replaced or removed
+
+        Snapshots are only ever swapped in by rename and journals removed by
+        compaction, so on POSIX an open handle keeps the old contents. Elsewhere
+        the file cannot be renamed over while open and is read up front instead.
+        """
+        if not os.path.exists(file_path):
+            return None
+        if os.name == 'posix':
+            return open(file_path, 'rb')
+        with open(file_path, 'rb') as f:
+            return io.BytesIO(f.read())
+
+    def _copy_file(self, source: IO[bytes], target_path: str, start: int = 0,
+                   length: Optional[int] = None, append: bool = False) -> None:
+        """Stream bytes from an open file into a target, atomically unless appending"""
+        source.seek(start)
+        remaining = length
+        target_dir = os.path.dirname(target_path) or '.'
+        if append:
+            target = open(target_path, 'ab')
+            temp_path = None
+        else:
+            fd, temp_path = tempfile.mkstemp(prefix='.backup.', suffix='.tmp', dir=target_dir)
+            target = os.fdopen(fd, 'wb')
+        try:
+            with target:
+                while remaining is None or remaining > 0:
+                    chunk = source.read(COPY_CHUNK_SIZE if remaining is None else min(COPY_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                target.flush()
+                os.fsync(target.fileno())
+            if temp_path is not None:
+                os.replace(temp_path, target_path)
+        except BaseException:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def backup(self, backup_dir: str, incremental: bool = True) -> Dict[str, str]:
+        """Backup all collections to a directory as a consistent point-in-time snapshot
+
+        Every collection is backed up as a JSON file, plus a copy of its journal
+        when it has one. Writers are only held back while the current files are
+        pinned open; the copying happens afterwards. With incremental backups a
+        manifest in the backup directory records what was copied, unchanged
+        collections are skipped, and a collection whose snapshot is unchanged
+        only gets the newly appended journal segment. Returns what was done per
+        collection: 'full', 'journal' or 'unchanged'.
+        """
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
-        
-        for collection_name, collection in self.collections.items():
-            backup_path = os.path.join(backup_dir, f"{collection_name}.json")
-            with open(backup_path, 'w', encoding='utf-8') as f:
-                json.dump(collection, f, indent=2, ensure_ascii=False)
+
+        manifest_path = os.path.join(backup_dir, BACKUP_MANIFEST)
+        manifest = {}
+        if incremental and os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+
+        pinned = {}
+        with self._writing():
+            # Queued group-commit writes belong to this point in time
+            self.flush()
+            for collection_name in self.list_collections():
+                snapshot_path = next((path for path in self._snapshot_paths(collection_name)
+                                      if os.path.exists(path)), None)
+                signature = None
+                if snapshot_path is not None:
+                    stat = os.stat(snapshot_path)
+                    signature = [snapshot_path, stat.st_mtime_ns, stat.st_size, stat.st_ino]
+                log_path = self.get_log_path(collection_name)
+                pinned[collection_name] = {
+                    'snapshot': self._pin_file(snapshot_path) if snapshot_path else None,
+                    'snapshotPath': snapshot_path,
+                    'signature': signature,
+                    'log': self._pin_file(log_path),
+                    'logSize': os.path.getsize(log_path) if os.path.exists(log_path) else 0
+                }
+
+        results = {}
+        try:
+            for collection_name, state in pinned.items():
+                json_path = os.path.join(backup_dir, f"{collection_name}.json")
+                log_path = os.path.join(backup_dir, f"{collection_name}.log")
+                previous = manifest.get(collection_name)
+                same_snapshot = previous is not None and previous['signature'] == state['signature'] \
+                    and os.path.exists(json_path)
+
+                if same_snapshot and previous['logSize'] == state['logSize']:
+                    results[collection_name] = 'unchanged'
+                    continue
+                if same_snapshot and previous['logSize'] < state['logSize'] and os.path.exists(log_path):
+                    self._copy_file(state['log'], log_path, start=previous['logSize'],
+                                    length=state['logSize'] - previous['logSize'], append=True)
+                    results[collection_name] = 'journal'
+                else:
+                    if state['snapshot'] is None:
+                        self._copy_file(io.BytesIO(b'[]'), json_path)
+                    elif state['snapshotPath'].endswith(SNAPSHOT_EXTENSIONS['json']):
+                        self._copy_file(state['snapshot'], json_path)
+                    else:
+                        # Other formats are converted so backups always hold plain JSON
+                        documents = self._decode_columnar(
+                            msgpack.unpackb(state['snapshot'].read(), raw=False, strict_map_key=False)
+                            if state['snapshotPath'].endswith(SNAPSHOT_EXTENSIONS['msgpack'])
+                            else json.loads(state['snapshot'].read())
+                        )
+                        self._copy_file(io.BytesIO(
+                            json.dumps(documents, indent=2, ensure_ascii=False).encode('utf-8')), json_path)
+                    if state['logSize']:
+                        self._copy_file(state['log'], log_path, length=state['logSize'])
+                    elif os.path.exists(log_path):
+                        os.remove(log_path)
+                    results[collection_name] = 'full'
+                manifest[collection_name] = {'signature': state['signature'], 'logSize': state['logSize']}
+        finally:
+            for state in pinned.values():
+                for f in (state['snapshot'], state['log']):
+                    if f is not None:
+                        f.close()
+
+        # Collections dropped since the last backup are dropped from it too
+        for collection_name in list(manifest):
+            if collection_name not in pinned:
+                del manifest[collection_name]
+                for extension in ('.json', '.log'):
+                    path = os.path.join(backup_dir, f"{collection_name}{extension}")
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        self._copy_file(io.BytesIO(json.dumps(manifest, indent=2).encode('utf-8')), manifest_path)
+        return results
 
     def restore(self, backup_dir: str) -> None:
-        """Restore all collections from a backup directory"""
+        """Restore all collections from a backup directory
+
+        Backup files are streamed into the data directory and the collections
+        are reloaded lazily, so a restore never holds two copies in memory. A
+        storage without journal mode replays a backed up journal into the
+        snapshot instead of keeping it, one collection at a time.
+        """
         if not os.path.exists(backup_dir):
             raise FileNotFoundError(f"Backup directory not found: {backup_dir}")
-        
+
         for file_name in os.listdir(backup_dir):
-            if file_name.endswith('.json'):
+            if file_name.endswith('.json') and file_name != BACKUP_MANIFEST:
                 collection_name = file_name[:-5]
                 backup_path = os.path.join(backup_dir, file_name)
-                with open(backup_path, 'r', encoding='utf-8') as f:
-                    collection = json.load(f)
-                self.collections[collection_name] = collection
-                self.save_collection(collection_name, collection)
+                backup_log_path = os.path.join(backup_dir, f"{collection_name}.log")
+                with self._writing():
+                    self._discard_collection(collection_name)
+                    json_path = os.path.join(self.data_dir, f"{collection_name}{SNAPSHOT_EXTENSIONS['json']}")
+                    with open(backup_path, 'rb') as f:
+                        self._copy_file(f, json_path)
+                    # The restored JSON snapshot is migrated to the configured format on its next save
+                    for path in self._snapshot_paths(collection_name):
+                        if path != json_path and os.path.exists(path):
+                            os.remove(path)
+                    log_path = self.get_log_path(collection_name)
+                    if os.path.exists(backup_log_path):
+                        with open(backup_log_path, 'rb') as f:
+                            self._copy_file(f, log_path)
+                    elif os.path.exists(log_path):
+                        os.remove(log_path)
+                    self._fsync_data_dir()
+                    if not self.journal and os.path.exists(log_path):
+                        # Without journal mode the log would never be truncated, fold it
+                        # into the snapshot now
+                        self._load_collection(collection_name)
+                        self.compact(collection_name)
+                        self._discard_collection(collection_name)
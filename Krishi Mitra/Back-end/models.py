@@ -42,6 +42,44 @@ class MarketPrice(db.Model):
     price = db.Column(db.Float)
     price_unit = db.Column(db.String(32))  # e.g., "Quintal"
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Range scans over one market's series, or a whole state's via the prefix
+        db.Index('ix_market_price_series', 'crop', 'state', 'market', 'timestamp'),
+    )
+
+class MarketPriceRollup(db.Model):
+    """Pre-aggregated prices per market for one week or calendar month"""
+    id = db.Column(db.Integer, primary_key=True)
+    crop = db.Column(db.String(64), nullable=False)
+    state = db.Column(db.String(64), nullable=False)
+    market = db.Column(db.String(128), nullable=False)
+    period = db.Column(db.String(8), nullable=False)  # 'week' or 'month'
+    period_start = db.Column(db.Date, nullable=False)  # Monday, or the 1st of the month
+    price_count = db.Column(db.Integer, default=0)
+    price_total = db.Column(db.Float, default=0.0)
+    min_price = db.Column(db.Float)
+    max_price = db.Column(db.Float)
+
+    __table_args__ = (
+        db.UniqueConstraint('crop', 'state', 'period', 'period_start', 'market', name='ux_market_price_rollup'),
+    )
+
+    @property
+    def avg_price(self):
+        return self.price_total / self.price_count if self.price_count else None
+
+class MarketCache(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    crop = db.Column(db.String(64))
+    location = db.Column(db.String(256))  # cache key: crop_state_district
+    data = db.Column(db.JSON)
+    expires_at = db.Column(db.DateTime, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_market_cache_lookup', 'crop', 'location', 'expires_at'),
+    )
     
 class SoilData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
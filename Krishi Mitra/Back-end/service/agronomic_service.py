@@ -1,6 +1,7 @@
 import json
 from typing import Dict, List, Any
-from models import User, FarmProfile
+from models import FarmProfile
+from utils.user_cache import UserSnapshot
 
 class AgronomicService:
     def __init__(self):
@@ -132,7 +133,7 @@ class AgronomicService:
             }
         }
     
-    def get_crop_recommendations(self, user: User) -> Dict[str, Any]:
+    def get_crop_recommendations(self, user: UserSnapshot) -> Dict[str, Any]:
         """Get crop recommendations based on user's location and soil data"""
         # Get user's farm profile
         farm_profile = FarmProfile.query.filter_by(user_id=user.id).first()
@@ -183,7 +184,7 @@ class AgronomicService:
         
         return score
     
-    def get_crop_advisory(self, user: User, crop_name: str) -> Dict[str, Any]:
+    def get_crop_advisory(self, user: UserSnapshot, crop_name: str) -> Dict[str, Any]:
         """Get detailed advisory for a specific crop"""
         crop_name = crop_name.lower()
         
@@ -0,0 +1,196 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, func
+from models import MarketPrice, db
+
+
+def _remove(values: List, value) -> None:
+    del values[bisect_left(values, value)]
+
+
+def _median(values: List, key=lambda value: value) -> Optional[float]:
+    """Get the median of an already sorted list"""
+    if not values:
+        return None
+    mid = len(values) // 2
+    return key(values[mid]) if len(values) % 2 else (key(values[mid - 1]) + key(values[mid])) / 2
+
+
+class CropView:
+    """Latest price of every mandi for one crop, kept in sorted order
+
+    Each update moves one market's price within the crop-wide and state
+    sorted lists, so min, max and median are read from fixed positions and
+    states stay ordered by spread (max - min) for top-k queries.
+    """
+
+    def __init__(self, crop: str):
+        self.crop = crop
+        self.latest: Dict[Tuple[str, str], Tuple[float, datetime]] = {}  # (state, market) -> (price, timestamp)
+        self.prices: List[float] = []
+        self.state_prices: Dict[str, List[Tuple[float, str]]] = {}
+        self.spreads: List[Tuple[float, str]] = []
+        self.seeded = False
+        self.seeded_at = 0.0
+        self.last_id = 0
+        self.synced_at = 0.0
+        # Held while the view syncs or is read, so one crop never waits on another
+        self.lock = threading.Lock()
+
+    def apply(self, state: str, market: str, price: float, timestamp: datetime) -> bool:
+        """Record a market price; older observations than the current one are ignored"""
+        key = (state, market)
+        current = self.latest.get(key)
+        if current is not None and current[1] > timestamp:
+            return False
+
+        state_prices = self.state_prices.setdefault(state, [])
+        old_spread = self._spread(state)
+        if current is not None:
+            _remove(self.prices, current[0])
+            _remove(state_prices, (current[0], market))
+        insort(self.prices, price)
+        insort(state_prices, (price, market))
+        self.latest[key] = (price, timestamp)
+
+        if old_spread is not None:
+            _remove(self.spreads, (old_spread, state))
+        insort(self.spreads, (self._spread(state), state))
+        return True
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'markets': len(self.prices),
+            'min_price': self.prices[0] if self.prices else None,
+            'max_price': self.prices[-1] if self.prices else None,
+            'median_price': _median(self.prices)
+        }
+
+    def state_summary(self, state: str) -> Dict[str, Any]:
+        state_prices = self.state_prices.get(state, [])
+        return {
+            'markets': [{'market': market, 'price': price} for price, market in state_prices],
+            'min_price': {'market': state_prices[0][1], 'price': state_prices[0][0]} if state_prices else None,
+            'max_price': {'market': state_prices[-1][1], 'price': state_prices[-1][0]} if state_prices else None,
+            'median_price': _median(state_prices, key=lambda entry: entry[0]),
+            'price_range': self._spread(state) or 0.0
+        }
+
+    def top_spreads(self, k: int) -> List[Dict[str, Any]]:
+        """Get the k states with the widest price spread between their mandis"""
+        return [{'state': state, 'spread': spread} for spread, state in reversed(self.spreads[-k:])] if k > 0 else []
+
+    def _spread(self, state: str) -> Optional[float]:
+        state_prices = self.state_prices.get(state)
+        if not state_prices:
+            return None
+        return state_prices[-1][0] - state_prices[0][0]
+
+
+class ComparisonView:
+    """Per-crop cross-market price views, maintained incrementally
+
+    A crop's view is seeded on first use from the latest price of each
+    (state, market), and afterwards only applies rows with ids past the
+    last one seen, at most once per sync_interval seconds, so new prices
+    from any process are picked up without recomputing the view per
+    request. Each crop syncs under its own lock.
+
+    Ids are assigned when a row is inserted, not when it commits, so a
+    slow transaction can commit a lower id after a higher one was already
+    synced. Each sync therefore re-reads the last id_window ids, and the
+    view is reseeded every reseed_interval seconds to catch rows that
+    committed later still. Re-applying a row is harmless.
+    """
+
+    def __init__(self, sync_interval: float = 30, top_k: int = 5, id_window: int = 1000,
+                 reseed_interval: float = 3600):
+        self.sync_interval = sync_interval
+        self.top_k = top_k
+        self.id_window = id_window
+        self.reseed_interval = reseed_interval
+        self._views: Dict[str, CropView] = {}
+        # Only guards the crop -> view mapping
+        self._lock = threading.Lock()
+
+    def apply(self, crop: str, state: str, market: str, price: float, timestamp: datetime) -> bool:
+        """Apply a single new price observation"""
+        view = self._view(crop)
+        with view.lock:
+            return view.apply(state, market, price, timestamp)
+
+    def comparison(self, crop: str, state: str, top_k: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Get a state's market comparison plus crop-wide statistics
+
+        Returns None when no prices are known for the crop.
+        """
+        view = self.sync(crop)
+        with view.lock:
+            if not view.prices:
+                return None
+            return {
+                **view.state_summary(state),
+                'crop': crop,
+                'state': state,
+                'national': view.summary(),
+                'top_spread_states': view.top_spreads(self.top_k if top_k is None else top_k)
+            }
+
+    def sync(self, crop: str, force: bool = False) -> CropView:
+        """Apply MarketPrice rows added since the crop's last sync"""
+        view = self._view(crop)
+        with view.lock:
+            if not force and time.monotonic() - view.synced_at < self.sync_interval:
+                return view
+            if not view.seeded or time.monotonic() - view.seeded_at >= self.reseed_interval:
+                self._seed(view)
+            rows = db.session.query(
+                MarketPrice.id, MarketPrice.state, MarketPrice.market, MarketPrice.price, MarketPrice.timestamp
+            ).filter(
+                MarketPrice.crop == crop,
+                MarketPrice.id > view.last_id - self.id_window
+            ).order_by(MarketPrice.id)
+            for row_id, state, market, price, timestamp in rows:
+                if price is not None and timestamp is not None:
+                    view.apply(state, market, price, timestamp)
+                view.last_id = max(view.last_id, row_id)
+            view.synced_at = time.monotonic()
+            return view
+
+    def _seed(self, view: CropView) -> None:
+        """Load the latest price per (state, market) instead of replaying the crop's history
+
+        Also used to reseed an existing view; apply() keeps any newer
+        prices it already holds.
+        """
+        # Read the id high-water mark first; rows added during the seed query
+        # are picked up by the tail, and apply() ignores older observations
+        view.last_id = db.session.query(func.max(MarketPrice.id)).filter(MarketPrice.crop == view.crop).scalar() or 0
+        latest = db.session.query(
+            MarketPrice.state, MarketPrice.market, func.max(MarketPrice.timestamp).label('timestamp')
+        ).filter(
+            MarketPrice.crop == view.crop
+        ).group_by(MarketPrice.state, MarketPrice.market).subquery()
+        rows = db.session.query(
+            MarketPrice.state, MarketPrice.market, MarketPrice.price, MarketPrice.timestamp
+        ).join(latest, and_(
+            MarketPrice.crop == view.crop,
+            MarketPrice.state == latest.c.state,
+            MarketPrice.market == latest.c.market,
+            MarketPrice.timestamp == latest.c.timestamp
+        ))
+        for state, market, price, timestamp in rows:
+            if price is not None and timestamp is not None:
+                view.apply(state, market, price, timestamp)
+        view.seeded = True
+        view.seeded_at = time.monotonic()
+
+    def _view(self, crop: str) -> CropView:
+        with self._lock:
+            view = self._views.get(crop)
+            if view is None:
+                view = self._views[crop] = CropView(crop)
+            return view
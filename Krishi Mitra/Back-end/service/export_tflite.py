@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Callable, Dict, Iterator, List
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+from service.inference_model import PestDiseaseModel
+from service.ml_services import INPUT_SHAPE, preprocess_image
+from service.tflite_model import TFLiteClassifier
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+MODEL_NAMES = ('pest_detection', 'disease_detection')
+
+
+def load_images(image_dir: str, limit: int) -> np.ndarray:
+    """Preprocess up to `limit` images from a directory exactly as served"""
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(image_dir)
+        for name in names if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    if not paths:
+        raise ValueError(f"No images found in {image_dir}")
+    images = np.empty((len(paths),) + INPUT_SHAPE, dtype=np.float32)
+    for index, path in enumerate(paths):
+        with Image.open(path) as image:
+            preprocess_image(image, out=images[index])
+    return images
+
+
+def convert(model: tf.keras.Model, quantize: str, calibration: np.ndarray) -> bytes:
+    """Convert a Keras classifier to a TFLite flatbuffer
+
+    float16 stores the weights as half floats and computes in float32;
+    int8 quantizes weights and activations, using the calibration images
+    to pick each tensor's range.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        converter.representative_dataset = _representative_dataset(calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+    return converter.convert()
+
+
+def _representative_dataset(images: np.ndarray) -> Callable[[], Iterator[List[np.ndarray]]]:
+    def generate():
+        for image in images:
+            yield [image[np.newaxis].astype(np.float32)]
+    return generate
+
+
+def top1_agreement(model: tf.keras.Model, model_path: str, images: np.ndarray, batch_size: int = 32) -> float:
+    """Fraction of images where the exported model's top class matches Keras"""
+    classifier = TFLiteClassifier(model_path)
+    matches = 0
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        expected = np.argmax(model(batch, training=False).numpy(), axis=1)
+        actual = np.argmax(classifier.predict(batch), axis=1)
+        matches += int(np.sum(expected == actual))
+    return matches / len(images)
+
+
+def export(model_dir: str, output_dir: str, quantize: str, calibration: np.ndarray, validation: np.ndarray,
+           min_agreement: float) -> Dict[str, Dict]:
+    """Export both classifiers, keeping only those that agree with Keras often enough
+
+    A model below min_agreement is not written, so a bad calibration
+    never replaces a working export.
+    """
+    keras_models = PestDiseaseModel(model_dir)
+    report = {}
+    for name, model in zip(MODEL_NAMES, (keras_models.pest_model, keras_models.disease_model)):
+        flatbuffer = convert(model, quantize, calibration)
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f'.{name}.', suffix='.tflite')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(flatbuffer)
+            agreement = top1_agreement(model, tmp_path, validation)
+            passed = agreement >= min_agreement
+            if passed:
+                os.replace(tmp_path, os.path.join(output_dir, f'{name}.tflite'))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        report[name] = {
+            'quantize': quantize,
+            'size_bytes': len(flatbuffer),
+            'top1_agreement': round(agreement, 4),
+            'passed': passed
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Export the pest and disease models to quantized TFLite and check them against Keras')
+    parser.add_argument('--model-dir', default='ml_models', help='Directory with the .h5 models')
+    parser.add_argument('--output-dir', help='Where to write the .tflite files (default: --model-dir)')
+    parser.add_argument('--quantize', choices=('float16', 'int8'), default='int8')
+    parser.add_argument('--calibration-dir', help='Leaf images for int8 calibration')
+    parser.add_argument('--validation-dir', help='Held-out leaf images for the agreement check '
+                                                 '(default: --calibration-dir)')
+    parser.add_argument('--samples', type=int, default=200, help='Images to read from each directory')
+    parser.add_argument('--min-agreement', type=float, default=0.98,
+                        help='Minimum top-1 agreement with Keras for an export to be kept')
+    args = parser.parse_args()
+
+    if args.calibration_dir:
+        calibration = load_images(args.calibration_dir, args.samples)
+    elif args.quantize == 'int8':
+        parser.error('--calibration-dir is required for int8 quantization')
+    else:
+        calibration = None
+    validation_dir = args.validation_dir or args.calibration_dir
+    if validation_dir:
+        validation = load_images(validation_dir, args.samples)
+    else:
+        # Only meaningful for the placeholder models; real exports should be
+        # checked against real images
+        print('No validation images given; checking agreement on random inputs', file=sys.stderr)
+        validation = np.random.default_rng(0).random((args.samples,) + INPUT_SHAPE, dtype=np.float32)
+
+    output_dir = args.output_dir or args.model_dir
+    os.makedirs(output_dir, exist_ok=True)
+    report = export(args.model_dir, output_dir, args.quantize, calibration, validation, args.min_agreement)
+    print(json.dumps(report, indent=2))
+    if not all(result['passed'] for result in report.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+class ForecastEngine:
+    """Vectorized seasonal-trend price forecaster
+
+    Price histories are a month axis shared by every series plus a 2D array
+    of shape (series, months); missing months are NaN. All series are
+    forecast together with array operations, so forecasting every
+    crop/state pair costs about as much as forecasting one.
+    """
+
+    def __init__(self, seasonal_amplitude: float = 0.1, history_noise: float = 0.05,
+                 forecast_noise: float = 0.03, band: float = 0.1, min_points: int = 6,
+                 rng: Optional[np.random.Generator] = None):
+        self.seasonal_amplitude = seasonal_amplitude
+        self.history_noise = history_noise
+        self.forecast_noise = forecast_noise
+        self.band = band
+        self.min_points = min_points
+        self.rng = rng
+
+    # ----------------- Month axis -----------------
+    @staticmethod
+    def month_range(end: Optional[datetime] = None, periods: int = 24) -> np.ndarray:
+        """Get the last `periods` calendar months up to and including end"""
+        last = np.datetime64(end or datetime.now(), 'M')
+        return last - np.arange(periods - 1, -1, -1)
+
+    @staticmethod
+    def month_numbers(months: np.ndarray) -> np.ndarray:
+        """Get calendar month numbers (1-12) for a month axis"""
+        return months.astype(np.int64) % 12 + 1
+
+    @staticmethod
+    def years(months: np.ndarray) -> np.ndarray:
+        return months.astype('datetime64[Y]').astype(np.int64) + 1970
+
+    def seasonal_factors(self, months: np.ndarray) -> np.ndarray:
+        """Get the seasonal multiplier for each month on the axis"""
+        return 1 + self.seasonal_amplitude * np.sin(2 * np.pi * (self.month_numbers(months) - 1) / 12)
+
+    # ----------------- History -----------------
+    def simulate_history(self, n_series: int, periods: int = 24, base_price: float = 2000.0,
+                         end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Generate seasonal price histories for n_series series
+
+        Returns the month axis and a (n_series, periods) price array.
+        """
+        months = self.month_range(end, periods)
+        noise = 1 + self.history_noise * self._generator().standard_normal((n_series, periods))
+        prices = np.round(base_price * self.seasonal_factors(months) * noise, 2)
+        return months, prices
+
+    # ----------------- Forecast -----------------
+    def forecast(self, months: np.ndarray, prices: np.ndarray, horizon: int) -> Dict[str, np.ndarray]:
+        """Forecast `horizon` months past the end of the axis for every series
+
+        Each series continues from its last observed price along its average
+        monthly change, scaled by the seasonal factor, with multiplicative
+        noise and a symmetric confidence band. Returns the forecast month
+        axis and (series, horizon) arrays of prices and bounds.
+        """
+        prices = np.atleast_2d(np.asarray(prices, dtype=float))
+        observed = ~np.isnan(prices)
+        counts = observed.sum(axis=1)
+        rows = np.arange(prices.shape[0])
+        first = prices[rows, observed.argmax(axis=1)]
+        last = prices[rows, prices.shape[1] - 1 - observed[:, ::-1].argmax(axis=1)]
+
+        trend = np.where(counts >= 2, (last - first) / np.maximum(counts, 1), 0.0)
+
+        future = months[-1] + np.arange(1, horizon + 1)
+        steps = np.arange(1, horizon + 1)
+        noise = 1 + self.forecast_noise * self._generator().standard_normal((prices.shape[0], horizon))
+        forecast = (last[:, None] + trend[:, None] * steps) * self.seasonal_factors(future) * noise
+
+        return {
+            'months': future,
+            'price': forecast,
+            'lower_bound': forecast * (1 - self.band),
+            'upper_bound': forecast * (1 + self.band)
+        }
+
+    def confidence(self, prices: np.ndarray) -> np.ndarray:
+        """Get a 0.3-1.0 confidence per series from its coefficient of variation
+
+        Series with fewer than min_points observations get 0.5.
+        """
+        prices = np.atleast_2d(np.asarray(prices, dtype=float))
+        counts = (~np.isnan(prices)).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nanmean(prices, axis=1)
+            cv = np.where(mean > 0, np.nanstd(prices, axis=1) / mean, 1.0)
+        confidence = np.maximum(0.3, 1 - cv)
+        return np.round(np.where(counts < self.min_points, 0.5, confidence), 2)
+
+    # ----------------- Records -----------------
+    def history_records(self, months: np.ndarray, prices: np.ndarray) -> List[Dict]:
+        """Convert one series to HistoricalPrice dicts, skipping missing months"""
+        keep = ~np.isnan(prices)
+        months, prices = months[keep], np.round(prices[keep], 2)
+        return [
+            {'date': str(date), 'price': float(price), 'month': int(month), 'year': int(year)}
+            for date, price, month, year in zip(
+                np.datetime_as_string(months, unit='M'), prices,
+                self.month_numbers(months), self.years(months)
+            )
+        ]
+
+    def forecast_records(self, result: Dict[str, np.ndarray], row: int) -> List[Dict]:
+        """Convert one series of a forecast() result to ForecastPrice dicts"""
+        months = result['months']
+        return [
+            {
+                'date': str(date),
+                'price': float(price),
+                'month': int(month),
+                'year': int(year),
+                'lower_bound': float(lower),
+                'upper_bound': float(upper)
+            }
+            for date, price, month, year, lower, upper in zip(
+                np.datetime_as_string(months, unit='M'),
+                np.round(result['price'][row], 2),
+                self.month_numbers(months), self.years(months),
+                np.round(result['lower_bound'][row], 2),
+                np.round(result['upper_bound'][row], 2)
+            )
+        ]
+
+    def _generator(self) -> np.random.Generator:
+        # Generators are not thread-safe, so share one only when injected
+        return self.rng if self.rng is not None else np.random.default_rng()
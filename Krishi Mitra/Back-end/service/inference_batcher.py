@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+class InferenceOverloadedError(RuntimeError):
+    """Raised when the inference queue is full"""
+
+
+class InferenceTimeoutError(TimeoutError):
+    """Raised when a request misses its deadline"""
+
+
+class MicroBatcher:
+    """Collect concurrent inference requests into batched forward passes
+
+    Callers submit one example each. A worker thread waits for the first
+    request, then gathers more for up to max_wait_ms or until max_batch_size
+    examples are queued, runs predict_fn once on the stacked batch and hands
+    each caller its row of every output. With several workers, that many
+    batches can be in flight at once. The queue is bounded: submitting
+    to a full queue fails fast instead of building an unbounded backlog,
+    and requests whose deadline passed while queued are dropped unrun.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], Sequence[np.ndarray]], max_batch_size: int = 16,
+                 max_wait_ms: float = 10, max_queue: int = 256, default_timeout: float = 5.0, workers: int = 1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.default_timeout = default_timeout
+        self._queue: 'queue.Queue[Optional[Tuple[np.ndarray, float, Future]]]' = queue.Queue(max_queue)
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f'inference-batcher-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, example: np.ndarray, timeout: Optional[float] = None) -> Future:
+        """Queue one example; the future resolves to a tuple with its row of each output"""
+        if self._stopped:
+            raise RuntimeError("Batcher is stopped")
+        deadline = time.monotonic() + (self.default_timeout if timeout is None else timeout)
+        future = Future()
+        try:
+            self._queue.put_nowait((example, deadline, future))
+        except queue.Full:
+            raise InferenceOverloadedError("Inference queue is full") from None
+        return future
+
+    def infer(self, example: np.ndarray, timeout: Optional[float] = None) -> Tuple[np.ndarray, ...]:
+        """Run one example through the next batch and wait for its outputs"""
+        timeout = self.default_timeout if timeout is None else timeout
+        future = self.submit(example, timeout)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise InferenceTimeoutError("Inference deadline exceeded") from None
+
+    def stop(self) -> None:
+        """Finish queued requests, then stop the worker"""
+        if not self._stopped:
+            self._stopped = True
+            for _ in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            window_end = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = window_end - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[Tuple[np.ndarray, float, Future]]) -> None:
+        now = time.monotonic()
+        live = []
+        for example, deadline, future in batch:
+            if deadline <= now:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(InferenceTimeoutError("Inference deadline exceeded while queued"))
+            elif future.set_running_or_notify_cancel():
+                live.append((example, future))
+        if not live:
+            return
+
+        try:
+            outputs = self.predict_fn(np.stack([example for example, _ in live]))
+        except Exception as e:
+            for _, future in live:
+                future.set_exception(e)
+            return
+        for row, (_, future) in enumerate(live):
+            future.set_result(tuple(output[row] for output in outputs))
@@ -0,0 +1,70 @@
+import numpy as np
+import tensorflow as tf
+from typing import Tuple
+import os
+from service.ml_services import INPUT_SHAPE, PEST_CLASSES, DISEASE_CLASSES
+
+class PestDiseaseModel:
+    """The pest and disease classifiers behind one compiled call
+
+    Imports TensorFlow, so it is only loaded where inference runs: in the
+    web process for in-process inference, or in each pool worker.
+    """
+
+    def __init__(self, model_dir: str = 'ml_models'):
+        # Load models
+        self.model_dir = model_dir
+        self.pest_model = self._load_pest_model()
+        self.disease_model = self._load_disease_model()
+
+        # Both classifiers traced into one graph and called directly,
+        # skipping predict()'s per-call dataset and callback setup
+        self._infer = tf.function(
+            self._forward,
+            input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32)]
+        )
+        self.warm_up()
+
+    def _load_pest_model(self):
+        """Load pest detection model"""
+        # In a real implementation, this would load a trained model
+        # For demo, we'll use a placeholder
+        model_path = os.path.join(self.model_dir, 'pest_detection.h5')
+        if os.path.exists(model_path):
+            return tf.keras.models.load_model(model_path)
+        else:
+            # Return a dummy model for demo
+            return self._create_dummy_model(len(PEST_CLASSES))
+
+    def _load_disease_model(self):
+        """Load disease detection model"""
+        # In a real implementation, this would load a trained model
+        # For demo, we'll use a placeholder
+        model_path = os.path.join(self.model_dir, 'disease_detection.h5')
+        if os.path.exists(model_path):
+            return tf.keras.models.load_model(model_path)
+        else:
+            # Return a dummy model for demo
+            return self._create_dummy_model(len(DISEASE_CLASSES))
+
+    def _create_dummy_model(self, num_classes: int):
+        """Create a dummy model for demo purposes"""
+        model = tf.keras.Sequential([
+            tf.keras.layers.Flatten(input_shape=INPUT_SHAPE),
+            tf.keras.layers.Dense(128, activation='relu'),
+            tf.keras.layers.Dense(num_classes, activation='softmax')
+        ])
+        return model
+
+    def _forward(self, images: tf.Tensor) -> Tuple[tf.Tensor, tf.Tensor]:
+        """Run both classifiers on the same input batch"""
+        return self.pest_model(images, training=False), self.disease_model(images, training=False)
+
+    def warm_up(self) -> None:
+        """Trace the inference graph so the first request doesn't pay for it"""
+        self._infer(tf.zeros((1,) + INPUT_SHAPE, tf.float32))
+
+    def predict_batch(self, images: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get pest and disease softmaxes for a (batch, 224, 224, 3) array in one call"""
+        pest_predictions, disease_predictions = self._infer(tf.convert_to_tensor(images, tf.float32))
+        return pest_predictions.numpy(), disease_predictions.numpy()
@@ -0,0 +1,173 @@
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Tuple
+import numpy as np
+from service.ml_services import INPUT_SHAPE, PEST_CLASSES, DISEASE_CLASSES, normalize_pixels
+
+OUTPUT_WIDTH = len(PEST_CLASSES) + len(DISEASE_CLASSES)
+
+
+def _worker_main(input_name: str, output_name: str, conn, max_batch_size: int,
+                 intra_op_threads: int, inter_op_threads: int, backend: str, model_dir: str) -> None:
+    """Inference worker: load the models once, then serve batches until told to stop"""
+    if backend == 'keras':
+        import tensorflow as tf
+        # Must be set before TensorFlow creates its thread pools
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    from service.ml_services import load_model
+
+    # Spawned workers share the pool's resource tracker, which keeps block
+    # names in a set, so attaching here leaves its one registration intact
+    input_block = shared_memory.SharedMemory(name=input_name)
+    output_block = shared_memory.SharedMemory(name=output_name)
+    inputs = np.ndarray((max_batch_size,) + INPUT_SHAPE, dtype=np.float32, buffer=input_block.buf)
+    outputs = np.ndarray((max_batch_size, OUTPUT_WIDTH), dtype=np.float32, buffer=output_block.buf)
+    try:
+        model = load_model(backend, model_dir, num_threads=intra_op_threads)
+        conn.send(('ready', None))
+        while True:
+            size = conn.recv()
+            if size is None:
+                break
+            try:
+                pest, disease = model.predict_batch(inputs[:size])
+                outputs[:size, :len(PEST_CLASSES)] = pest
+                outputs[:size, len(PEST_CLASSES):] = disease
+                conn.send(('ok', None))
+            except Exception as e:
+                conn.send(('error', repr(e)))
+    finally:
+        del inputs, outputs
+        input_block.close()
+        output_block.close()
+        conn.close()
+
+
+class _Worker:
+    """One inference process and the shared-memory blocks it reads and writes"""
+
+    def __init__(self, context, index: int, max_batch_size: int, intra_op_threads: int, inter_op_threads: int,
+                 backend: str, model_dir: str, start_timeout: float):
+        self.closed = False
+        self.input_block = shared_memory.SharedMemory(
+            create=True, size=max_batch_size * int(np.prod(INPUT_SHAPE)) * 4)
+        self.output_block = shared_memory.SharedMemory(create=True, size=max_batch_size * OUTPUT_WIDTH * 4)
+        self.inputs = np.ndarray((max_batch_size,) + INPUT_SHAPE, dtype=np.float32, buffer=self.input_block.buf)
+        self.outputs = np.ndarray((max_batch_size, OUTPUT_WIDTH), dtype=np.float32, buffer=self.output_block.buf)
+
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(self.input_block.name, self.output_block.name, child_conn, max_batch_size,
+                  intra_op_threads, inter_op_threads, backend, model_dir),
+            name=f'inference-worker-{index}',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(start_timeout) or self.conn.recv()[0] != 'ready':
+            self.close()
+            raise RuntimeError(f"Inference worker {index} failed to start")
+
+    def run(self, images: np.ndarray) -> np.ndarray:
+        size = len(images)
+        if images.dtype == np.uint8:
+            normalize_pixels(images, self.inputs[:size])
+        else:
+            self.inputs[:size] = images
+        self.conn.send(size)
+        status, error = self.conn.recv()
+        if status != 'ok':
+            raise RuntimeError(f"Inference failed: {error}")
+        return self.outputs[:size].copy()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.process.is_alive():
+                self.conn.send(None)
+                self.process.join(5)
+        except (OSError, EOFError):
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+        del self.inputs, self.outputs
+        for block in (self.input_block, self.output_block):
+            block.close()
+            block.unlink()
+
+
+class InferencePool:
+    """Pest/disease inference in dedicated worker processes
+
+    Each worker loads the backend's models once and owns a pair of
+    shared-memory blocks: the caller copies a batch into the input block
+    and sends only its size down a pipe, and the worker writes both
+    softmaxes into the output block. The web process never imports
+    TensorFlow, and a forward pass only blocks the thread waiting on it.
+    intra_op_threads doubles as the TFLite interpreter's thread count.
+
+    A pool belongs to one web process: with several web workers each
+    starts its own, multiplying the model copies on the host.
+    """
+
+    def __init__(self, num_workers: int = 1, max_batch_size: int = 16, intra_op_threads: int = 1,
+                 inter_op_threads: int = 1, backend: str = 'keras', model_dir: str = 'ml_models',
+                 start_timeout: float = 120):
+        self.max_batch_size = max_batch_size
+        self._options = (max_batch_size, intra_op_threads, inter_op_threads, backend, model_dir, start_timeout)
+        # TensorFlow is not fork-safe
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._workers: List[_Worker] = []
+        self._idle: 'queue.Queue[int]' = queue.Queue()
+        self._dispatch = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='inference-dispatch')
+        try:
+            for index in range(num_workers):
+                self._workers.append(_Worker(self._context, index, *self._options))
+                self._idle.put(index)
+        except Exception:
+            self.close()
+            raise
+
+    def submit(self, images: np.ndarray) -> Future:
+        """Queue a batch for the next free worker; resolves to (pest, disease) softmaxes"""
+        return self._dispatch.submit(self.predict_batch, images)
+
+    def predict_batch(self, images: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get pest and disease softmaxes for a batch, waiting for a free worker
+
+        uint8 pixel batches are normalized directly into the worker's input block.
+        """
+        results = [self._run_chunk(images[start:start + self.max_batch_size])
+                   for start in range(0, len(images), self.max_batch_size)]
+        outputs = np.concatenate(results) if len(results) > 1 else results[0]
+        return outputs[:, :len(PEST_CLASSES)], outputs[:, len(PEST_CLASSES):]
+
+    def close(self) -> None:
+        self._dispatch.shutdown(wait=True)
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers = []
+
+    def _run_chunk(self, images: np.ndarray) -> np.ndarray:
+        index = self._idle.get()
+        try:
+            return self._workers[index].run(images)
+        except (EOFError, OSError):
+            # The worker died mid-batch; replace it before releasing the slot
+            with self._lock:
+                self._workers[index].close()
+                self._workers[index] = _Worker(self._context, index, *self._options)
+            raise RuntimeError("Inference worker crashed") from None
+        finally:
+            self._idle.put(index)
@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from models import db
+from service.market_service import MarketService
+from service.price_store import PriceStore, normalize_record
+from utils.http_client import UpstreamClient, get_upstream_client
+
+
+class MarketIngestWorker:
+    """Pull the mandi price resource into the price store off the request path
+
+    Pages of the data.gov.in resource are fetched concurrently, at most
+    `concurrency` at a time, and written in offset order as they arrive,
+    so only the pages in flight are held in memory. A checkpoint file
+    records the next offset and the newest prices seen so far after every
+    page, so an interrupted run resumes where it stopped. When a run completes, the newest prices
+    seen for every crop/state and crop/state/district are upserted into
+    MarketCache so lookups for those keys skip the upstream API.
+    """
+
+    def __init__(self, resource_url: str, api_key: str, checkpoint_path: str, page_size: int = 500,
+                 concurrency: int = 4, http_client: Optional[UpstreamClient] = None,
+                 store: Optional[PriceStore] = None):
+        self.resource_url = resource_url
+        self.api_key = api_key
+        self.checkpoint_path = checkpoint_path
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.http = http_client or get_upstream_client()
+        self.store = store or PriceStore()
+        # (crop, state, district) -> [latest, previous] as (timestamp, price, market, unit)
+        self._latest: Dict[Tuple[str, str, Optional[str]], list] = {}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], **kwargs) -> 'MarketIngestWorker':
+        options = {
+            'resource_url': config['MARKET_API_URL'],
+            'api_key': config['MARKET_API_KEY'],
+            'checkpoint_path': config['MARKET_INGEST_CHECKPOINT'],
+            'page_size': config['MARKET_INGEST_PAGE_SIZE'],
+            'concurrency': config['MARKET_INGEST_CONCURRENCY']
+        }
+        options.update(kwargs)
+        return cls(**options)
+
+    def run(self, restart: bool = False) -> Dict[str, int]:
+        """Ingest the resource, resuming from the checkpoint unless restart is set
+
+        Must be called inside an app context. Returns ingestion counters.
+        """
+        return asyncio.run(self._run(restart))
+
+    # ----------------- Pipeline -----------------
+    async def _run(self, restart: bool) -> Dict[str, int]:
+        checkpoint = {} if restart else self._load_checkpoint()
+        offset = 0
+        self._latest = {}
+        if checkpoint.get('resource_url') == self.resource_url and not checkpoint.get('complete'):
+            offset = checkpoint.get('next_offset', 0)
+            # Keys only seen before the interruption still belong in MarketCache
+            self._latest = self._decode_latest(checkpoint.get('latest', []))
+
+        stats = {'pages': 0, 'inserted': 0, 'duplicates': 0, 'rejected': 0, 'cached': 0}
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='market-ingest')
+        try:
+            page = await loop.run_in_executor(executor, self._fetch_page, offset)
+            total = page.get('total')
+            self._persist_page(page, offset, total, stats)
+
+            if total is None:
+                # Resource without a total: walk pages until a short one
+                while len(page.get('records', [])) >= self.page_size:
+                    offset += self.page_size
+                    page = await loop.run_in_executor(executor, self._fetch_page, offset)
+                    self._persist_page(page, offset, total, stats)
+            else:
+                await self._fetch_remaining(loop, executor, offset + self.page_size, int(total), stats)
+        finally:
+            executor.shutdown(wait=False)
+
+        stats['cached'] = self._refresh_market_cache()
+        self._save_checkpoint({
+            'resource_url': self.resource_url,
+            'next_offset': 0,
+            'total': total,
+            'complete': True,
+            'updated_at': datetime.utcnow().isoformat()
+        })
+        return stats
+
+    async def _fetch_remaining(self, loop, executor, start: int, total: int, stats: Dict[str, int]) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(offset: int) -> Dict[str, Any]:
+            # Released once the page is persisted, bounding pages held in memory
+            await semaphore.acquire()
+            return await loop.run_in_executor(executor, self._fetch_page, offset)
+
+        offsets = range(start, total, self.page_size)
+        tasks = [asyncio.ensure_future(fetch(offset)) for offset in offsets]
+        try:
+            for offset, task in zip(offsets, tasks):
+                page = await task
+                try:
+                    self._persist_page(page, offset, total, stats)
+                finally:
+                    semaphore.release()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _fetch_page(self, offset: int) -> Dict[str, Any]:
+        response = self.http.get(self.resource_url, params={
+            'api-key': self.api_key,
+            'format': 'json',
+            'offset': offset,
+            'limit': self.page_size
+        })
+        response.raise_for_status()
+        return response.json()
+
+    def _persist_page(self, page: Dict[str, Any], offset: int, total: Optional[int], stats: Dict[str, int]) -> None:
+        result = self.store.ingest_records(self._track(page.get('records', [])))
+        for key in ('inserted', 'duplicates', 'rejected'):
+            stats[key] += result[key]
+        stats['pages'] += 1
+        self._save_checkpoint({
+            'resource_url': self.resource_url,
+            'next_offset': offset + self.page_size,
+            'total': total,
+            'complete': False,
+            'updated_at': datetime.utcnow().isoformat(),
+            'latest': self._encode_latest()
+        })
+
+    def _track(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Normalize records, remembering the newest prices per cache key"""
+        for record in records:
+            row = normalize_record(record)
+            if row is None:
+                yield record  # counted as rejected by the store
+                continue
+            observation = (row['timestamp'], row['price'], row['market'], row['price_unit'])
+            for district in (None, row['district']):
+                latest = self._latest.setdefault((row['crop'], row['state'], district), [])
+                if not latest or observation[0] > latest[0][0]:
+                    latest.insert(0, observation)
+                    del latest[2:]
+                elif observation[0] < latest[0][0] and (len(latest) < 2 or observation[0] > latest[1][0]):
+                    latest[1:] = [observation]
+            yield row
+
+    def _refresh_market_cache(self) -> int:
+        service = MarketService(api_key=self.api_key, http_client=self.http)
+        try:
+            for (crop, state, district), latest in self._latest.items():
+                current, previous = latest[0], latest[-1]
+                data = service._process_market_data({
+                    'crop': crop,
+                    'state': state,
+                    'district': district or 'All Districts',
+                    'current_price': current[1],
+                    'previous_price': previous[1],
+                    'unit': current[3],
+                    'market': current[2]
+                })
+                service._store_market_prices(crop, f"{crop}_{state}_{district or 'all'}", data, commit=False)
+            db.session.commit()
+        finally:
+            service.close()
+        return len(self._latest)
+
+    # ----------------- Checkpoint -----------------
+    def _encode_latest(self) -> list:
+        return [
+            [crop, state, district, [[timestamp.isoformat(), price, market, unit]
+                                     for timestamp, price, market, unit in latest]]
+            for (crop, state, district), latest in self._latest.items()
+        ]
+
+    def _decode_latest(self, entries: list) -> Dict[Tuple[str, str, Optional[str]], list]:
+        return {
+            (crop, state, district): [(datetime.fromisoformat(timestamp), price, market, unit)
+                                      for timestamp, price, market, unit in latest]
+            for crop, state, district, latest in entries
+        }
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp_path, self.checkpoint_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Ingest mandi prices from the configured market resource')
+    parser.add_argument('--url', help='Override MARKET_API_URL, e.g. a local stub server')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from offset 0')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        overrides = {'resource_url': args.url} if args.url else {}
+        stats = MarketIngestWorker.from_config(app.config, **overrides).run(restart=args.restart)
+    print(json.dumps(stats))
+
+
+if __name__ == '__main__':
+    main()
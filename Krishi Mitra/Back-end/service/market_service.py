@@ -1,8 +1,28 @@
-import requests
+import logging
+import threading
 import numpy as np
-from typing import Dict, List, Any, TypedDict, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, TypedDict, Optional, Tuple
 from datetime import datetime, timedelta
+from flask import current_app, has_app_context
 from models import MarketCache, db
+from utils.cache import TTLCache, SingleFlight
+from utils.http_client import UpstreamClient, get_upstream_client
+from service.forecast_engine import ForecastEngine
+from service.price_store import PriceStore
+from service.comparison_view import ComparisonView
+
+logger = logging.getLogger(__name__)
+
+# How long fetched prices stay valid in both cache tiers
+MARKET_CACHE_TTL = timedelta(hours=6)
+# How long past expiry an entry may still be served while it is revalidated
+MARKET_MAX_STALE = timedelta(hours=24)
+# Months of stored history used for forecasts
+HISTORY_MONTHS = 24
+# Keys tracked for prewarming; past this the least requested are pruned
+PRICE_DEMAND_MAX_KEYS = 10000
 
 
 # ---------- TypedDicts for structured data ----------
@@ -53,27 +73,176 @@ class PriceForecast(TypedDict):
     confidence: float
 
 
+class MarketPriceBatch(TypedDict):
+    prices: List[MarketData]
+    errors: List[Dict[str, Any]]
+
+
 # ---------- Service Class ----------
 
 class MarketService:
-    def __init__(self, api_key: str):
+    # Shared by every instance in the worker: an in-process tier in front of the
+    # MarketCache table, and request coalescing so concurrent misses for one key
+    # trigger a single upstream fetch
+    price_cache = TTLCache(
+        max_entries=2048,
+        default_ttl=MARKET_CACHE_TTL.total_seconds(),
+        max_stale=MARKET_MAX_STALE.total_seconds()
+    )
+    price_fetches = SingleFlight()
+    # Per-key request counts used to pick which keys the warmer keeps fresh;
+    # only keys that resolved to prices are counted
+    price_demand = Counter()
+    forecast_engine = ForecastEngine()
+    price_store = PriceStore()
+    comparison_view = ComparisonView()
+    _refreshing = set()
+    _refresh_lock = threading.Lock()
+
+    def __init__(self, api_key: str, stale_while_revalidate: bool = True,
+                 http_client: Optional[UpstreamClient] = None, base_url: Optional[str] = None):
         self.api_key = api_key
-        self.base_url = "https://api.agmarknet.gov.in"  # Example API URL
+        self.base_url = base_url or "https://api.agmarknet.gov.in"  # Example API URL
+        self.stale_while_revalidate = stale_while_revalidate
+        self.http = http_client or get_upstream_client()
+        # Background revalidation of stale entries, and concurrent upstream
+        # fetches for batch requests; owned by this instance so closing it
+        # leaves other instances working
+        self.refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='market-refresh')
+        self.fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='market-fetch')
+    
+    def close(self) -> None:
+        """Stop this instance's background refresh and fetch pools"""
+        self.refresh_pool.shutdown(wait=False)
+        self.fetch_pool.shutdown(wait=False)
     
     # ----------------- Market Prices -----------------
     def get_market_prices(self, crop: str, state: str, district: Optional[str] = None) -> MarketData:
-        """Get current market prices for a crop"""
-        # Check cache first
+        """Get current market prices for a crop
+        
+        With stale_while_revalidate enabled, an expired entry is returned
+        immediately and refreshed in the background.
+        """
         cache_key = f"{crop}_{state}_{district or 'all'}"
-        cached_data = MarketCache.query.filter(
+        
+        # Check the in-process tier first
+        cached = self.price_cache.get_stale(cache_key)
+        if cached is not None:
+            data, fresh = cached
+            if fresh or self.stale_while_revalidate:
+                if not fresh:
+                    self.schedule_refresh(crop, state, district)
+                self._record_demand([(crop, state, district)])
+                return data
+        
+        data = self.price_fetches.do(cache_key, lambda: self._load_market_prices(crop, state, district, cache_key))
+        self._record_demand([(crop, state, district)])
+        return data
+    
+    def _load_market_prices(self, crop: str, state: str, district: Optional[str], cache_key: str) -> MarketData:
+        """Load prices from the database tier, or from the upstream API on a miss"""
+        now = datetime.utcnow()
+        cached_row = MarketCache.query.filter(
             MarketCache.crop == crop,
             MarketCache.location == cache_key,
-            MarketCache.expires_at > datetime.utcnow()
-        ).first()
+            MarketCache.expires_at > now - MARKET_MAX_STALE
+        ).order_by(MarketCache.expires_at.desc()).first()
+        
+        if cached_row:
+            # Keep the in-process copy no longer than the database row
+            self.price_cache.set(cache_key, cached_row.data, ttl=(cached_row.expires_at - now).total_seconds())
+            if cached_row.expires_at > now:
+                return cached_row.data
+            if self.stale_while_revalidate:
+                self.schedule_refresh(crop, state, district)
+                return cached_row.data
+        
+        return self.refresh_market_prices(crop, state, district)
+    
+    def get_market_prices_batch(self, items: List[Tuple[str, str, Optional[str]]]) -> MarketPriceBatch:
+        """Get current market prices for many (crop, state, district) keys
+        
+        Cached keys are resolved from the in-process tier and then a single
+        database query; the remaining keys are fetched from the upstream API
+        concurrently. Prices are returned in request order, and keys that
+        could not be fetched are reported under errors.
+        """
+        keys: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        for crop, state, district in items:
+            keys.setdefault(f"{crop}_{state}_{district or 'all'}", (crop, state, district))
+        
+        found: Dict[str, MarketData] = {}
+        stale: List[str] = []
+        
+        # In-process tier
+        for cache_key in keys:
+            cached = self.price_cache.get_stale(cache_key)
+            if cached is not None and (cached[1] or self.stale_while_revalidate):
+                found[cache_key] = cached[0]
+                if not cached[1]:
+                    stale.append(cache_key)
         
-        if cached_data:
-            return cached_data.data
+        # Database tier, one query for every remaining key
+        pending = [cache_key for cache_key in keys if cache_key not in found]
+        if pending:
+            now = datetime.utcnow()
+            rows = MarketCache.query.filter(
+                MarketCache.location.in_(pending),
+                MarketCache.expires_at > now - MARKET_MAX_STALE
+            ).order_by(MarketCache.expires_at.desc()).all()
+            for row in rows:
+                if row.location in found or row.crop != keys[row.location][0]:
+                    continue
+                fresh = row.expires_at > now
+                if fresh or self.stale_while_revalidate:
+                    self.price_cache.set(row.location, row.data, ttl=(row.expires_at - now).total_seconds())
+                    found[row.location] = row.data
+                    if not fresh:
+                        stale.append(row.location)
         
+        for cache_key in stale:
+            self.schedule_refresh(*keys[cache_key])
+        
+        # Upstream, fanned out; database writes stay on this thread's session
+        errors: List[Dict[str, Any]] = []
+        futures = {
+            cache_key: self.fetch_pool.submit(
+                self.price_fetches.do, cache_key, lambda key=keys[cache_key]: self._fetch_market_prices(*key)
+            )
+            for cache_key in keys if cache_key not in found
+        }
+        for cache_key, future in futures.items():
+            crop, state, district = keys[cache_key]
+            try:
+                found[cache_key] = future.result()
+            except Exception as e:
+                # Exception text can carry the upstream URL and its api_key; log it, don't return it
+                logger.warning("Price fetch failed for %s", cache_key, exc_info=True)
+                error = {'crop': crop, 'state': state, 'district': district, 'error': 'Price data unavailable'}
+                response = getattr(e, 'response', None)
+                if response is not None:
+                    error['status'] = response.status_code
+                errors.append(error)
+                continue
+            self._store_market_prices(crop, cache_key, found[cache_key], commit=False)
+        if futures:
+            db.session.commit()
+        self._record_demand([keys[cache_key] for cache_key in keys if cache_key in found])
+        
+        return {
+            'prices': [found[cache_key] for cache_key in keys if cache_key in found],
+            'errors': errors
+        }
+    
+    def refresh_market_prices(self, crop: str, state: str, district: Optional[str] = None) -> MarketData:
+        """Fetch prices from the upstream API and store them in both cache tiers"""
+        cache_key = f"{crop}_{state}_{district or 'all'}"
+        processed_data = self._fetch_market_prices(crop, state, district)
+        self._store_market_prices(crop, cache_key, processed_data)
+        return processed_data
+    
+    def _fetch_market_prices(self, crop: str, state: str, district: Optional[str]) -> MarketData:
+        """Fetch and process prices from the upstream API"""
         # Make API request
         params: Dict[str, str] = {
             'crop': crop,
@@ -83,23 +252,97 @@ class MarketService:
         if district:
             params['district'] = district
         
-        response = requests.get(f"{self.base_url}/prices", params=params)
+        response = self.http.get(f"{self.base_url}/prices", params=params)
+        response.raise_for_status()
         data = response.json()
         
         # Process data
-        processed_data: MarketData = self._process_market_data(data)
-        
-        # Cache the data (expires in 6 hours)
-        cache_entry = MarketCache(
-            crop=crop,
-            location=cache_key,
-            data=processed_data,
-            expires_at=datetime.utcnow() + timedelta(hours=6)
-        )
-        db.session.add(cache_entry)
-        db.session.commit()
+        return self._process_market_data(data)
+    
+    def _store_market_prices(self, crop: str, cache_key: str, processed_data: MarketData, commit: bool = True) -> None:
+        """Store fetched prices in both cache tiers"""
+        # Cache the data (expires in 6 hours), reusing the key's row if there is one
+        expires_at = datetime.utcnow() + MARKET_CACHE_TTL
+        cache_entry = MarketCache.query.filter(
+            MarketCache.crop == crop,
+            MarketCache.location == cache_key
+        ).order_by(MarketCache.expires_at.desc()).first()
+        if cache_entry:
+            cache_entry.data = processed_data
+            cache_entry.expires_at = expires_at
+        else:
+            cache_entry = MarketCache(
+                crop=crop,
+                location=cache_key,
+                data=processed_data,
+                expires_at=expires_at
+            )
+            db.session.add(cache_entry)
+        if commit:
+            db.session.commit()
+        self.price_cache.set(cache_key, processed_data)
+    
+    def schedule_refresh(self, crop: str, state: str, district: Optional[str] = None) -> bool:
+        """Refresh a key in the background; returns False if one is already queued"""
+        cache_key = f"{crop}_{state}_{district or 'all'}"
+        with self._refresh_lock:
+            if cache_key in self._refreshing:
+                return False
+            self._refreshing.add(cache_key)
         
-        return processed_data
+        # The worker thread needs its own app context for database access
+        app = current_app._get_current_object() if has_app_context() else None
+        
+        def refresh():
+            try:
+                if app is None:
+                    self.refresh_market_prices(crop, state, district)
+                else:
+                    with app.app_context():
+                        self.refresh_market_prices(crop, state, district)
+            except Exception:
+                # Keep serving the stale entry; the next request retries
+                logger.exception("Background refresh failed for %s", cache_key)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(cache_key)
+        
+        self.refresh_pool.submit(refresh)
+        return True
+    
+    def _record_demand(self, keys: List[Tuple[str, str, Optional[str]]]) -> None:
+        """Count requests for keys that resolved, keeping the counter bounded"""
+        with self._refresh_lock:
+            self.price_demand.update(keys)
+            if len(self.price_demand) > PRICE_DEMAND_MAX_KEYS:
+                # Keep the most requested half with halved counts, so keys that
+                # were popular long ago fade out as well
+                top = self.price_demand.most_common(PRICE_DEMAND_MAX_KEYS // 2)
+                self.price_demand.clear()
+                self.price_demand.update({key: max(1, count // 2) for key, count in top})
+    
+    def top_price_keys(self, limit: int) -> List[Tuple[str, str, Optional[str]]]:
+        """Get the most requested (crop, state, district) keys"""
+        with self._refresh_lock:
+            return [key for key, _ in self.price_demand.most_common(limit)]
+    
+    def prewarm_market_prices(self, limit: int, lead_time: timedelta) -> int:
+        """Refresh the most requested keys that expire within lead_time
+        
+        Returns the number of refreshes scheduled.
+        """
+        horizon = datetime.utcnow() + lead_time
+        scheduled = 0
+        for crop, state, district in self.top_price_keys(limit):
+            cache_key = f"{crop}_{state}_{district or 'all'}"
+            fresh_row = MarketCache.query.filter(
+                MarketCache.crop == crop,
+                MarketCache.location == cache_key,
+                MarketCache.expires_at > horizon
+            ).first()
+            if not fresh_row and self.schedule_refresh(crop, state, district):
+                scheduled += 1
+        return scheduled
     
     def _process_market_data(self, data: Dict[str, Any]) -> MarketData:
         """Process market price data"""
@@ -108,10 +351,9 @@ class MarketService:
         
         if current_price > previous_price:
             trend = 'up'
-            change_percent = ((current_price - previous_price) / previous_price) * 100
         else:
             trend = 'down'
-            change_percent = ((previous_price - current_price) / previous_price) * 100
+        change_percent = (abs(current_price - previous_price) / previous_price) * 100 if previous_price > 0 else 0.0
         
         return {
             'crop': data.get('crop', 'wheat'),
@@ -129,86 +371,62 @@ class MarketService:
     # ----------------- Forecast -----------------
     def get_price_forecast(self, crop: str, state: str, months: int = 12) -> PriceForecast:
         """Get price forecast for a crop"""
-        historical_data = self._get_historical_prices(crop, state)
-        forecast = self._generate_forecast(historical_data, months)
+        return self.get_price_forecasts([(crop, state)], months)[0]
+    
+    def get_price_forecasts(self, series: List[Tuple[str, str]], months: int = 12) -> List[PriceForecast]:
+        """Get price forecasts for many (crop, state) pairs in one vectorized pass"""
+        if not series:
+            return []
         
-        return {
-            'crop': crop,
-            'state': state,
-            'historical_data': historical_data,
-            'forecast': forecast,
-            'confidence': self._calculate_forecast_confidence(historical_data)
-        }
+        history_months, prices = self._get_historical_price_matrix(series)
+        result = self.forecast_engine.forecast(history_months, prices, months)
+        confidence = self.forecast_engine.confidence(prices)
+        
+        return [
+            {
+                'crop': crop,
+                'state': state,
+                'historical_data': self.forecast_engine.history_records(history_months, prices[row]),
+                'forecast': self.forecast_engine.forecast_records(result, row),
+                'confidence': float(confidence[row])
+            }
+            for row, (crop, state) in enumerate(series)
+        ]
     
     def _get_historical_prices(self, crop: str, state: str) -> List[HistoricalPrice]:
         """Get historical price data for a crop"""
-        base_price = 2000.0
-        prices: List[HistoricalPrice] = []
-        
-        for i in range(24):  # 24 months of historical data
-            month = datetime.now() - timedelta(days=30 * i)
-            seasonal_factor = 1 + 0.1 * float(np.sin(2 * np.pi * (month.month - 1) / 12))
-            random_factor = 1 + 0.05 * float(np.random.randn())
-            price = float(base_price * seasonal_factor * random_factor)
-            
-            prices.append({
-                'date': month.strftime('%Y-%m'),
-                'price': round(price, 2),
-                'month': month.month,
-                'year': month.year
-            })
-        
-        return prices[::-1]
-    
-    def _generate_forecast(self, historical_data: List[HistoricalPrice], months: int) -> List[ForecastPrice]:
-        """Generate price forecast"""
-        prices = [item['price'] for item in historical_data]
-        forecast: List[ForecastPrice] = []
-        
-        if len(prices) >= 2:
-            trend = (prices[-1] - prices[0]) / len(prices)
-        else:
-            trend = 0.0
-        
-        last_price = float(prices[-1])
-        last_date = datetime.strptime(historical_data[-1]['date'], '%Y-%m')
-        
-        for i in range(1, months + 1):
-            forecast_date = last_date + timedelta(days=30 * i)
-            forecast_month = forecast_date.month
-            
-            seasonal_factor = 1 + 0.1 * float(np.sin(2 * np.pi * (forecast_month - 1) / 12))
-            forecast_price = last_price + trend * i
-            forecast_price = float(forecast_price * seasonal_factor)
-            forecast_price = float(forecast_price * (1 + 0.03 * np.random.randn()))
-            
-            forecast.append({
-                'date': forecast_date.strftime('%Y-%m'),
-                'price': round(forecast_price, 2),
-                'month': forecast_month,
-                'year': forecast_date.year,
-                'lower_bound': round(forecast_price * 0.9, 2),
-                'upper_bound': round(forecast_price * 1.1, 2)
-            })
-        
-        return forecast
-    
-    def _calculate_forecast_confidence(self, historical_data: List[HistoricalPrice]) -> float:
-        """Calculate confidence level for forecast"""
-        if len(historical_data) < 6:
-            return 0.5
-        
-        prices = [item['price'] for item in historical_data]
-        mean_price = float(np.mean(prices))
-        std_price = float(np.std(prices))
-        cv = std_price / mean_price if mean_price > 0 else 1.0
-        
-        confidence = max(0.3, 1 - cv)
-        return float(round(confidence, 2))
+        history_months, prices = self._get_historical_price_matrix([(crop, state)])
+        return self.forecast_engine.history_records(history_months, prices[0])
+    
+    def _get_historical_price_matrix(self, series: List[Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Get a shared month axis and a (series, months) price array from the price store
+        
+        Series with no stored history fall back to simulated prices.
+        """
+        history_months = self.forecast_engine.month_range(periods=HISTORY_MONTHS)
+        prices = self.price_store.monthly_matrix(
+            [(crop.strip().lower(), state) for crop, state in series], history_months
+        )
+        
+        missing = np.isnan(prices).all(axis=1)
+        if missing.any():
+            _, simulated = self.forecast_engine.simulate_history(int(missing.sum()), periods=HISTORY_MONTHS, base_price=2000.0)
+            prices[missing] = simulated
+        return history_months, prices
     
     # ----------------- Market Comparison -----------------
     def get_market_comparison(self, crop: str, state: str) -> MarketComparison:
-        """Compare market prices across different markets"""
+        """Compare market prices across different markets
+        
+        Reads the incrementally maintained view of the latest price at every
+        mandi, which also carries crop-wide statistics and the states with
+        the widest spread.
+        """
+        comparison = self.comparison_view.comparison(crop.strip().lower(), state)
+        if comparison and comparison['markets']:
+            return {**comparison, 'crop': crop}
+        
+        # Sample markets until the price store has data for this crop and state
         market_data = [
             {'market': 'Delhi Mandi', 'price': 2100},
             {'market': 'Kolkata Mandi', 'price': 2050},
@@ -227,4 +445,43 @@ class MarketService:
             'min_price': min_price,
             'max_price': max_price,
             'price_range': max_price['price'] - min_price['price']
-        }
\ No newline at end of file
+        }
+
+
+# ---------- Pre-warming ----------
+
+class MarketPriceWarmer:
+    """Periodically refresh the most requested price keys before they expire"""
+    
+    def __init__(self, app, top_n: int = 20, interval: float = 900, lead_time: float = 1800):
+        self.app = app
+        self.top_n = top_n
+        self.interval = interval
+        self.lead_time = timedelta(seconds=lead_time)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='market-warmer', daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def run_once(self) -> int:
+        """Schedule refreshes for keys about to expire"""
+        with self.app.app_context():
+            service = self.app.extensions['services'].get('market')
+            return service.prewarm_market_prices(self.top_n, self.lead_time)
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Market price pre-warm failed")
@@ -1,64 +1,152 @@
+import threading
 import numpy as np
-import tensorflow as tf
 from PIL import Image
-from typing import Dict, Any, List, Tuple
-import os
+from typing import Dict, Any, List, Optional, Tuple
+from service.inference_batcher import MicroBatcher
+
+# Model input: 224x224 RGB scaled to [0, 1]
+INPUT_SIZE = (224, 224)
+INPUT_SHAPE = INPUT_SIZE + (3,)
+
+# Class labels, in model output order
+PEST_CLASSES = ['aphid', 'blight', 'rust', 'fungus', 'bollworm', 'healthy']
+DISEASE_CLASSES = ['blast', 'bacterial_leaf_blight', 'sheath_blight', 'rust', 'healthy']
+
+# Inference backends: full Keras models on TensorFlow, or the quantized
+# exports from service.export_tflite on the TFLite runtime
+BACKENDS = ('keras', 'tflite')
+
+def load_model(backend: str = 'keras', model_dir: str = 'ml_models', num_threads: int = 1):
+    """Load the pest/disease models for a backend; both expose predict_batch"""
+    if backend == 'keras':
+        from service.inference_model import PestDiseaseModel
+        return PestDiseaseModel(model_dir)
+    if backend == 'tflite':
+        from service.tflite_model import TFLitePestDiseaseModel
+        return TFLitePestDiseaseModel(model_dir, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+def load_pixels(image: Image.Image) -> np.ndarray:
+    """Decode an image to a (224, 224, 3) uint8 RGB array
+    
+    Pass an image straight from Image.open: JPEGs are then decoded at the
+    smallest 1/2, 1/4 or 1/8 scale still covering the input size instead
+    of at full resolution.
+    """
+    image.draft('RGB', INPUT_SIZE)
+    
+    # Palette and exotic modes (CMYK, 16-bit, ...) can't be resized smoothly
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGB')
+    image = image.resize(INPUT_SIZE)
+    
+    if image.mode in ('RGBA', 'LA'):
+        # Flatten onto white; the colour under transparent pixels is arbitrary
+        background = Image.new('RGB', INPUT_SIZE, (255, 255, 255))
+        background.paste(image.convert('RGBA'), mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+def normalize_pixels(pixels: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Scale uint8 pixels to [0, 1] float32 in one pass, writing into out if given"""
+    return np.divide(pixels, 255, out=out, dtype=np.float32)
+
+def preprocess_image(image: Image.Image, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Preprocess image for model input, optionally into a row of a preallocated batch"""
+    return normalize_pixels(load_pixels(image), out)
 
 class MLService:
-    def __init__(self):
-        # Load models
-        self.pest_model = self._load_pest_model()
-        self.disease_model = self._load_disease_model()
+    def __init__(self, max_batch_size: int = 16, max_wait_ms: float = 10, max_queue: int = 256,
+                 request_timeout: float = 5.0, inference_workers: int = 0, intra_op_threads: int = 1,
+                 inter_op_threads: int = 1, backend: str = 'keras', model_dir: str = 'ml_models'):
+        """Set up pest and disease detection
         
-        # Class labels
-        self.pest_classes = ['aphid', 'blight', 'rust', 'fungus', 'bollworm', 'healthy']
-        self.disease_classes = ['blast', 'bacterial_leaf_blight', 'sheath_blight', 'rust', 'healthy']
-    
-    def _load_pest_model(self):
-        """Load pest detection model"""
-        # In a real implementation, this would load a trained model
-        # For demo, we'll use a placeholder
-        model_path = os.path.join('ml_models', 'pest_detection.h5')
-        if os.path.exists(model_path):
-            return tf.keras.models.load_model(model_path)
+        With inference_workers > 0 the models run in that many worker
+        processes and TensorFlow is never imported here; with 0 they are
+        loaded into this process. Either way each web process holds its
+        own copies, so keep inference_workers at 1 under multi-worker
+        servers. backend picks the Keras models or their
+        quantized TFLite exports (see BACKENDS).
+        """
+        self.pest_classes = PEST_CLASSES
+        self.disease_classes = DISEASE_CLASSES
+        self.max_batch_size = max_batch_size
+        # Pool workers normalize pixels straight into their shared memory;
+        # in-process batches are normalized into a per-thread buffer
+        self.pooled = inference_workers > 0
+        self._buffers = threading.local()
+        
+        if self.pooled:
+            from service.inference_pool import InferencePool
+            self.backend = InferencePool(
+                num_workers=inference_workers,
+                max_batch_size=max_batch_size,
+                intra_op_threads=intra_op_threads,
+                inter_op_threads=inter_op_threads,
+                backend=backend,
+                model_dir=model_dir
+            )
         else:
-            # Return a dummy model for demo
-            return self._create_dummy_model(len(self.pest_classes))
+            self.backend = load_model(backend, model_dir, num_threads=intra_op_threads)
+        
+        # Concurrent analyze_image calls share batched forward passes, with
+        # one batch in flight per worker process
+        self.batcher = MicroBatcher(
+            self.predict_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue=max_queue,
+            default_timeout=request_timeout,
+            workers=max(1, inference_workers)
+        )
     
-    def _load_disease_model(self):
-        """Load disease detection model"""
-        # In a real implementation, this would load a trained model
-        # For demo, we'll use a placeholder
-        model_path = os.path.join('ml_models', 'disease_detection.h5')
-        if os.path.exists(model_path):
-            return tf.keras.models.load_model(model_path)
-        else:
-            # Return a dummy model for demo
-            return self._create_dummy_model(len(self.disease_classes))
+    def predict_batch(self, images: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get pest and disease softmaxes for a (batch, 224, 224, 3) array in one call
+        
+        Takes uint8 pixels from load_pixels or already normalized float32.
+        """
+        if images.dtype == np.uint8 and not self.pooled:
+            images = normalize_pixels(images, self._batch_buffer(len(images)))
+        return self.backend.predict_batch(images)
+    
+    def _batch_buffer(self, size: int) -> np.ndarray:
+        """This thread's preallocated float32 batch tensor, sliced to size"""
+        buffer = getattr(self._buffers, 'batch', None)
+        if buffer is None or len(buffer) < size:
+            buffer = np.empty((max(size, self.max_batch_size),) + INPUT_SHAPE, dtype=np.float32)
+            self._buffers.batch = buffer
+        return buffer[:size]
     
-    def _create_dummy_model(self, num_classes: int):
-        """Create a dummy model for demo purposes"""
-        model = tf.keras.Sequential([
-            tf.keras.layers.Flatten(input_shape=(224, 224, 3)),
-            tf.keras.layers.Dense(128, activation='relu'),
-            tf.keras.layers.Dense(num_classes, activation='softmax')
-        ])
-        return model
+    def close(self) -> None:
+        """Finish queued analyses, then stop the batching and inference workers"""
+        self.batcher.stop()
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
     
-    def analyze_image(self, image: Image.Image) -> Dict[str, Any]:
-        """Analyze image for pests and diseases"""
-        # Preprocess image
-        processed_image = self._preprocess_image(image)
+    def analyze_image(self, image: Image.Image, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Analyze image for pests and diseases
         
-        # Predict pests
-        pest_predictions = self.pest_model.predict(processed_image)
-        pest_class = self.pest_classes[np.argmax(pest_predictions[0])]
-        pest_confidence = float(np.max(pest_predictions[0]))
+        Raises InferenceOverloadedError when the queue is full and
+        InferenceTimeoutError when the result misses its deadline.
+        """
+        # Decode to uint8 pixels; they are normalized once batched
+        pixels = load_pixels(image)
         
-        # Predict diseases
-        disease_predictions = self.disease_model.predict(processed_image)
-        disease_class = self.disease_classes[np.argmax(disease_predictions[0])]
-        disease_confidence = float(np.max(disease_predictions[0]))
+        # Predict pests and diseases in the next batched pass
+        pest_predictions, disease_predictions = self.batcher.infer(pixels, timeout)
+        return self._interpret(pest_predictions, disease_predictions)
+    
+    def _interpret(self, pest_predictions: np.ndarray, disease_predictions: np.ndarray) -> Dict[str, Any]:
+        """Pick the primary issue from one image's pest and disease softmaxes"""
+        pest_class = self.pest_classes[np.argmax(pest_predictions)]
+        pest_confidence = float(np.max(pest_predictions))
+        
+        disease_class = self.disease_classes[np.argmax(disease_predictions)]
+        disease_confidence = float(np.max(disease_predictions))
         
         # Determine primary issue
         if pest_confidence > disease_confidence and pest_class != 'healthy':
@@ -79,17 +167,3 @@ class MLService:
                 'message': 'No pests or diseases detected',
                 'confidence': max(pest_confidence, disease_confidence)
             }
-    
-    def _preprocess_image(self, image: Image.Image) -> np.ndarray:
-        """Preprocess image for model input"""
-        # Resize image to model input size
-        image = image.resize((224, 224))
-        
-        # Convert to array and normalize
-        img_array = tf.keras.preprocessing.image.img_to_array(image)
-        img_array = img_array / 255.0
-        
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        return img_array
\ No newline at end of file
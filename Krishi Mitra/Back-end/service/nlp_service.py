@@ -5,6 +5,7 @@ from typing import Dict, List, Any, Optional
 from PIL import Image
 from models import User, FarmProfile
 from services.ml_service import MLService
+from service.inference_batcher import InferenceOverloadedError, InferenceTimeoutError
 
 # Define INTENTS globally or load from a config file
 INTENTS = {
@@ -101,8 +102,9 @@ INTENTS = {
 }
 
 class NLPService:
-    def __init__(self):
-        self.ml_service = MLService()
+    def __init__(self, ml_service: Optional[MLService] = None):
+        # Share one MLService so concurrent image analyses batch together
+        self.ml_service = ml_service or MLService()
     
     def process_message(self, message: str, language: str, image_data: Optional[str] = None) -> Dict[str, Any]:
         """Process user message to extract intent and entities"""
@@ -203,6 +205,9 @@ class NLPService:
             analysis = self.ml_service.analyze_image(image)
             
             return analysis
+        except (InferenceOverloadedError, InferenceTimeoutError) as e:
+            print(f"Image analysis unavailable: {e}")
+            return {'error': 'Image analysis is busy, please try again shortly'}
         except Exception as e:
             print(f"Error processing image: {e}")
             return {'error': 'Image processing failed'}
@@ -0,0 +1,218 @@
+import csv
+import json
+import numpy as np
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import func
+from models import MarketPrice, MarketPriceRollup, db
+
+# Rows written per flush during ingestion
+INGEST_CHUNK_SIZE = 5000
+ROLLUP_PERIODS = ('week', 'month')
+# Series looked up per query; keeps IN lists under SQLite's bound parameter limit
+SERIES_QUERY_CHUNK = 400
+
+
+def period_start(day: date, period: str) -> date:
+    """Get the first day of the week (Monday) or month containing day"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def normalize_record(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Convert one mandi dump row to MarketPrice fields
+
+    Accepts the data.gov.in/agmarknet layout (commodity, arrival_date as
+    dd/mm/yyyy, modal_price) as well as MarketPrice's own field names.
+    Returns None for rows without a usable price or date.
+    """
+    record = {str(k).strip().lower(): v for k, v in record.items()}
+    crop = record.get('commodity') or record.get('crop')
+    state = record.get('state')
+    market = record.get('market')
+    price = record.get('modal_price', record.get('price'))
+    arrival = record.get('arrival_date') or record.get('timestamp') or record.get('date')
+    if not (crop and state and market and arrival) or price in (None, ''):
+        return None
+
+    try:
+        price = float(price)
+        if not price > 0:
+            # Zero, negative and NaN prices are placeholders for missing data
+            return None
+        if isinstance(arrival, datetime):
+            timestamp = arrival
+        elif isinstance(arrival, date):
+            timestamp = datetime.combine(arrival, datetime.min.time())
+        else:
+            for fmt in ('%d/%m/%Y', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S'):
+                try:
+                    timestamp = datetime.strptime(str(arrival).strip(), fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                return None
+    except (TypeError, ValueError):
+        return None
+
+    return {
+        'crop': str(crop).strip().lower(),
+        'state': str(state).strip(),
+        'district': (str(record['district']).strip() if record.get('district') else None),
+        'market': str(market).strip(),
+        'price': price,
+        'price_unit': record.get('price_unit') or record.get('unit') or 'Quintal',
+        'timestamp': timestamp
+    }
+
+
+class PriceStore:
+    """Historical mandi prices with weekly and monthly rollups
+
+    Raw prices live in MarketPrice; MarketPriceRollup keeps count, total,
+    min and max per market and period, updated on ingestion, so forecasts
+    and comparisons scan a few rows per month instead of every arrival.
+    """
+
+    # ----------------- Ingestion -----------------
+    def ingest_file(self, path: str) -> Dict[str, int]:
+        """Ingest a mandi dump: CSV, a JSON list, or a data.gov.in JSON response"""
+        if path.lower().endswith('.csv'):
+            with open(path, newline='', encoding='utf-8') as f:
+                return self.ingest_records(csv.DictReader(f))
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return self.ingest_records(data.get('records', []) if isinstance(data, dict) else data)
+
+    def ingest_records(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Insert raw price records and fold them into the rollups
+
+        Records already stored for the same crop, state, market and
+        timestamp are skipped, so re-ingesting a dump is harmless. Returns
+        counts of inserted, duplicate and rejected records.
+        """
+        stats = {'inserted': 0, 'duplicates': 0, 'rejected': 0}
+        for chunk in self._chunks(records, stats):
+            rows = self._new_rows(chunk)
+            stats['duplicates'] += len(chunk) - len(rows)
+            if rows:
+                db.session.bulk_insert_mappings(MarketPrice, rows)
+                self._update_rollups(rows)
+                db.session.commit()
+                stats['inserted'] += len(rows)
+        return stats
+
+    def _chunks(self, records: Iterable[Dict[str, Any]], stats: Dict[str, int]) -> Iterator[List[Dict[str, Any]]]:
+        chunk = []
+        for record in records:
+            row = normalize_record(record)
+            if row is None:
+                stats['rejected'] += 1
+                continue
+            chunk.append(row)
+            if len(chunk) >= INGEST_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _new_rows(self, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop rows already stored or repeated within the chunk"""
+        key = lambda row: (row['crop'], row['state'], row['market'], row['timestamp'])
+        existing = set(
+            db.session.query(MarketPrice.crop, MarketPrice.state, MarketPrice.market, MarketPrice.timestamp)
+            .filter(
+                MarketPrice.crop.in_({row['crop'] for row in chunk}),
+                MarketPrice.state.in_({row['state'] for row in chunk}),
+                MarketPrice.timestamp.between(min(row['timestamp'] for row in chunk),
+                                              max(row['timestamp'] for row in chunk))
+            )
+        )
+        rows = []
+        for row in chunk:
+            if key(row) not in existing:
+                existing.add(key(row))
+                rows.append(row)
+        return rows
+
+    def _update_rollups(self, rows: List[Dict[str, Any]]) -> None:
+        # Aggregate the chunk first so each rollup row is touched once
+        deltas: Dict[Tuple[str, str, str, str, date], List[float]] = {}
+        for row in rows:
+            day = row['timestamp'].date()
+            for period in ROLLUP_PERIODS:
+                key = (row['crop'], row['state'], row['market'], period, period_start(day, period))
+                delta = deltas.get(key)
+                if delta is None:
+                    deltas[key] = [1, row['price'], row['price'], row['price']]
+                else:
+                    delta[0] += 1
+                    delta[1] += row['price']
+                    delta[2] = min(delta[2], row['price'])
+                    delta[3] = max(delta[3], row['price'])
+
+        starts = [key[4] for key in deltas]
+        existing = {
+            (r.crop, r.state, r.market, r.period, r.period_start): r
+            for r in MarketPriceRollup.query.filter(
+                MarketPriceRollup.crop.in_({key[0] for key in deltas}),
+                MarketPriceRollup.state.in_({key[1] for key in deltas}),
+                MarketPriceRollup.period_start.between(min(starts), max(starts))
+            )
+        }
+        for key, (count, total, low, high) in deltas.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                crop, state, market, period, start = key
+                db.session.add(MarketPriceRollup(
+                    crop=crop, state=state, market=market, period=period, period_start=start,
+                    price_count=count, price_total=total, min_price=low, max_price=high
+                ))
+            else:
+                rollup.price_count += count
+                rollup.price_total += total
+                rollup.min_price = min(rollup.min_price, low)
+                rollup.max_price = max(rollup.max_price, high)
+
+    # ----------------- Queries -----------------
+    def monthly_matrix(self, series: List[Tuple[str, str]], months: np.ndarray) -> np.ndarray:
+        """Get average monthly prices across each state's markets
+
+        Returns a (series, months) array aligned to the datetime64[M] axis,
+        with NaN where a month has no data.
+        """
+        prices = np.full((len(series), len(months)), np.nan)
+        if not series:
+            return prices
+        # The same series may be requested more than once; fill every row
+        rows_by_series: Dict[Tuple[str, str], List[int]] = {}
+        for row, key in enumerate(series):
+            rows_by_series.setdefault(tuple(key), []).append(row)
+        # Sorted so each chunk spans few crops and the crop x state cross product stays small
+        keys = sorted(rows_by_series)
+        first = months[0].item()
+        last = months[-1].item()
+
+        for offset in range(0, len(keys), SERIES_QUERY_CHUNK):
+            chunk = keys[offset:offset + SERIES_QUERY_CHUNK]
+            # Crop and state filtered separately, one OR term per pair overflows
+            # SQLite's expression depth; unrequested pairs are dropped below
+            query = db.session.query(
+                MarketPriceRollup.crop, MarketPriceRollup.state, MarketPriceRollup.period_start,
+                func.sum(MarketPriceRollup.price_total) / func.sum(MarketPriceRollup.price_count)
+            ).filter(
+                MarketPriceRollup.crop.in_({crop for crop, _ in chunk}),
+                MarketPriceRollup.state.in_({state for _, state in chunk}),
+                MarketPriceRollup.period == 'month',
+                MarketPriceRollup.period_start.between(first, last)
+            ).group_by(MarketPriceRollup.crop, MarketPriceRollup.state, MarketPriceRollup.period_start)
+
+            for crop, state, start, price in query:
+                rows = rows_by_series.get((crop, state))
+                if rows is None:
+                    continue
+                column = int(np.datetime64(start, 'M') - months[0])
+                prices[rows, column] = price
+        return prices
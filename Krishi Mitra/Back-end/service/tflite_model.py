@@ -0,0 +1,79 @@
+import numpy as np
+import threading
+from typing import Tuple
+import os
+
+try:
+    # The standalone runtime avoids importing the full TensorFlow package
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    from tensorflow.lite import Interpreter
+
+
+class TFLiteClassifier:
+    """One exported classifier run through a TFLite interpreter
+
+    Handles float32, float16-weight and int8 models; for models with
+    integer inputs or outputs the tensors are (de)quantized here using the
+    scale and zero point stored in the model.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = 1):
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # Interpreters are not thread-safe
+        self._lock = threading.Lock()
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        """Get the float32 outputs for a batch, resizing the input tensor to fit it"""
+        with self._lock:
+            if len(images) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], (len(images),) + images.shape[1:])
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = len(images)
+
+            self.interpreter.set_tensor(self._input['index'], self._quantize(images))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output['index']))
+
+    def _quantize(self, images: np.ndarray) -> np.ndarray:
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return images.astype(np.float32, copy=False)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(images / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, values: np.ndarray) -> np.ndarray:
+        if self._output['dtype'] == np.float32:
+            return values.copy()
+        scale, zero_point = self._output['quantization']
+        return (values.astype(np.float32) - zero_point) * scale
+
+
+class TFLitePestDiseaseModel:
+    """Quantized pest and disease classifiers on the TFLite runtime
+
+    Loads pest_detection.tflite and disease_detection.tflite as written by
+    service.export_tflite. Uses a fraction of the Keras models' memory and
+    needs no TensorFlow import when tflite_runtime is installed.
+    """
+
+    def __init__(self, model_dir: str = 'ml_models', num_threads: int = 1):
+        self.pest_model = self._load_model(os.path.join(model_dir, 'pest_detection.tflite'), num_threads)
+        self.disease_model = self._load_model(os.path.join(model_dir, 'disease_detection.tflite'), num_threads)
+
+    def _load_model(self, model_path: str, num_threads: int) -> TFLiteClassifier:
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found; export it with 'python -m service.export_tflite'")
+        return TFLiteClassifier(model_path, num_threads)
+
+    def predict_batch(self, images: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get pest and disease softmaxes for a (batch, 224, 224, 3) array"""
+        return self.pest_model.predict(images), self.disease_model.predict(images)
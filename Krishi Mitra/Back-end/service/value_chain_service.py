@@ -6,6 +6,7 @@ import os
 from typing import Dict, List, Any, Optional
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta   
+from utils.user_cache import UserSnapshot
 # models.py
 from dataclasses import dataclass
 from typing import Optional
@@ -237,7 +238,7 @@ def __init__(self):
         ]
         return providers
 
-    def create_market_listing(self, user: User, crop: str, quantity: float, price: float) -> Dict[str, Any]:
+    def create_market_listing(self, user: UserSnapshot, crop: str, quantity: float, price: float) -> Dict[str, Any]:
         """Create a market listing for a farmer's produce"""
         listing_id = f"LIST_{datetime.now().strftime('%Y%m%d%H%M%S')}"
         return {
@@ -257,7 +258,7 @@ def __init__(self):
 # - Line where group_id is created
 # - All references to datetime.datetime.utcnow() should be datetime.utcnow()
 # 
-def create_market_listing(self, user: User, crop: str, quantity: float, price: float) -> Dict[str, Any]:
+def create_market_listing(self, user: UserSnapshot, crop: str, quantity: float, price: float) -> Dict[str, Any]:
     """Create a market listing for a farmer's produce"""
     # In a real implementation, this would save to a database
     # For demo, we'll return a mock response
@@ -320,7 +321,7 @@ def create_market_listing(self, user: User, crop: str, quantity: float, price: f
         
         return listings
     
-    def connect_with_buyer(self, listing_id: str, buyer_id: str, user: User) -> Dict[str, Any]:
+    def connect_with_buyer(self, listing_id: str, buyer_id: str, user: UserSnapshot) -> Dict[str, Any]:
         """Connect a farmer with a buyer"""
         # In a real implementation, this would create a connection and notify both parties
         # For demo, we'll return a mock response
@@ -336,7 +337,7 @@ def create_market_listing(self, user: User, crop: str, quantity: float, price: f
             'message': 'Connection request sent. Waiting for buyer response.'
         }
     
-    def create_group_procurement(self, user: User, crop: str, quantity: float) -> Dict[str, Any]:
+    def create_group_procurement(self, user: UserSnapshot, crop: str, quantity: float) -> Dict[str, Any]:
         """Create a group procurement request"""
         # In a real implementation, this would save to a database
         # For demo, we'll return a mock response
@@ -400,7 +401,7 @@ def create_market_listing(self, user: User, crop: str, quantity: float, price: f
         
         return groups
     
-    def join_group_procurement(self, group_id: str, user: User) -> Dict[str, Any]:
+    def join_group_procurement(self, group_id: str, user: UserSnapshot) -> Dict[str, Any]:
         """Join a group procurement request"""
         # In a real implementation, this would update the group membership
         # For demo, we'll return a mock response
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from flask import Flask
+from models import MarketPrice, db
+from service.comparison_view import ComparisonView
+
+
+class ComparisonViewTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(self.tmp_dir, 'test.db')
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        shutil.rmtree(self.tmp_dir)
+
+    def add_price(self, row_id, market, price, day):
+        db.session.add(MarketPrice(id=row_id, crop='wheat', state='Punjab', market=market, price=price,
+                                   timestamp=datetime(2024, 1, day)))
+        db.session.commit()
+
+    def test_sync_picks_up_lower_id_committed_late(self):
+        view = ComparisonView(sync_interval=0)
+        self.add_price(1, 'Khanna', 2000.0, 1)
+        self.add_price(3, 'Khanna', 2100.0, 2)
+        self.assertEqual(view.comparison('wheat', 'Punjab')['national']['markets'], 1)
+
+        # Id 2 was handed out before id 3 but its transaction committed after the sync
+        self.add_price(2, 'Rajpura', 1900.0, 2)
+        comparison = view.comparison('wheat', 'Punjab')
+
+        self.assertEqual(comparison['national']['markets'], 2)
+        self.assertEqual(comparison['min_price'], {'market': 'Rajpura', 'price': 1900.0})
+        self.assertEqual(comparison['max_price'], {'market': 'Khanna', 'price': 2100.0})
+
+    def test_reseed_picks_up_rows_older_than_the_window(self):
+        view = ComparisonView(sync_interval=0, id_window=0, reseed_interval=0)
+        self.add_price(1, 'Khanna', 2000.0, 1)
+        self.add_price(3, 'Khanna', 2100.0, 2)
+        view.sync('wheat')
+
+        self.add_price(2, 'Rajpura', 1900.0, 2)
+        self.assertEqual(view.comparison('wheat', 'Punjab')['national']['markets'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,293 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from json_storage import JSONStorage, ReadWriteLock
+
+
+def _insert_shared(data_dir, count):
+    storage = JSONStorage(data_dir, journal=True, shared=True)
+    for i in range(count):
+        storage.insert_one('crops', {'i': i, 'pid': os.getpid()})
+
+
+class JSONStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.tmp_dir, 'data')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+class JournalModeSwitchTest(JSONStorageTestCase):
+    def test_plain_storage_truncates_journal_left_by_journal_mode(self):
+        storage = JSONStorage(self.data_dir, journal=True)
+        doc = storage.insert_one('crops', {'v': 1})
+        storage.update_one('crops', doc['id'], {'v': 2})
+
+        plain = JSONStorage(self.data_dir)
+        plain.update_one('crops', doc['id'], {'v': 3})
+        self.assertFalse(os.path.exists(plain.get_log_path('crops')))
+
+        self.assertEqual(JSONStorage(self.data_dir).find_by_id('crops', doc['id'])['v'], 3)
+
+
+class GroupCommitTest(JSONStorageTestCase):
+    def test_queued_writes_are_flushed_at_exit(self):
+        script = ("import sys; from json_storage import JSONStorage; "
+                  "JSONStorage(sys.argv[1], commit_window=5).insert_one('crops', {'v': 1})")
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-c', script, self.data_dir], cwd=backend_dir, check=True, timeout=30)
+
+        self.assertEqual(JSONStorage(self.data_dir).count_documents('crops'), 1)
+
+    def test_close_flushes_queued_writes(self):
+        storage = JSONStorage(self.data_dir, journal=True, commit_window=5)
+        storage.insert_one('crops', {'v': 1})
+        self.assertEqual(JSONStorage(self.data_dir, journal=True).count_documents('crops'), 0)
+        storage.close()
+
+        self.assertEqual(JSONStorage(self.data_dir, journal=True).count_documents('crops'), 1)
+
+
+class UpdateTest(JSONStorageTestCase):
+    def test_updates_cannot_change_id(self):
+        storage = JSONStorage(self.data_dir, journal=True)
+        doc = storage.insert_one('crops', {'v': 1})
+
+        with self.assertRaises(ValueError):
+            storage.update_one('crops', doc['id'], {'id': 'other'})
+        with self.assertRaises(ValueError):
+            storage.update_many('crops', {'v': 1}, {'id': 'other', 'v': 2})
+        with self.assertRaises(ValueError):
+            storage.bulk_write('crops', [{'update_one': {'id': doc['id'], 'updates': {'v': 3}}},
+                                         {'update_many': {'query': {}, 'updates': {'id': 'other'}}}])
+
+        self.assertEqual(storage.find_by_id('crops', doc['id'])['v'], 1)
+        self.assertIsNone(storage.find_by_id('crops', 'other'))
+        self.assertEqual(JSONStorage(self.data_dir, journal=True).find_by_id('crops', doc['id'])['v'], 1)
+
+
+class SortTest(JSONStorageTestCase):
+    def test_ints_and_floats_sort_together(self):
+        storage = JSONStorage(self.data_dir)
+        storage.insert_many('crops', [{'v': 3}, {'v': 2.5}, {'v': 1}, {'v': 10.0}, {}, {'v': 'a'}, {'v': True}])
+
+        ordered = [d.get('v') for d in storage.find_iter('crops', sort='v')]
+        self.assertEqual(ordered, [True, 1, 2.5, 3, 10.0, 'a', None])
+        self.assertEqual([d.get('v') for d in storage.find_iter('crops', sort='v', descending=True, limit=5)],
+                         ['a', 10.0, 3, 2.5, 1])
+
+
+class BackupRestoreTest(JSONStorageTestCase):
+    def test_journal_backup_restored_into_plain_storage(self):
+        source = JSONStorage(os.path.join(self.tmp_dir, 'source'), journal=True)
+        doc = source.insert_one('crops', {'v': 1})
+        source.update_one('crops', doc['id'], {'v': 2})
+        backup_dir = os.path.join(self.tmp_dir, 'backup')
+        source.backup(backup_dir)
+        self.assertTrue(os.path.exists(os.path.join(backup_dir, 'crops.log')))
+
+        target = JSONStorage(self.data_dir)
+        target.restore(backup_dir)
+        self.assertFalse(os.path.exists(target.get_log_path('crops')))
+        self.assertEqual(target.find_by_id('crops', doc['id'])['v'], 2)
+        target.update_one('crops', doc['id'], {'v': 3})
+
+        self.assertEqual(JSONStorage(self.data_dir).find_by_id('crops', doc['id'])['v'], 3)
+
+    def test_journal_backup_restored_into_journal_storage(self):
+        source = JSONStorage(os.path.join(self.tmp_dir, 'source'), journal=True)
+        doc = source.insert_one('crops', {'v': 1})
+        source.update_one('crops', doc['id'], {'v': 2})
+        backup_dir = os.path.join(self.tmp_dir, 'backup')
+        source.backup(backup_dir)
+
+        target = JSONStorage(self.data_dir, journal=True)
+        target.restore(backup_dir)
+        target.update_one('crops', doc['id'], {'v': 3})
+
+        self.assertEqual(JSONStorage(self.data_dir, journal=True).find_by_id('crops', doc['id'])['v'], 3)
+
+
+class ReadWriteLockTest(unittest.TestCase):
+    def test_writer_excludes_readers_and_other_writers(self):
+        lock = ReadWriteLock()
+        state = {'readers': 0, 'writers': 0}
+        violations = []
+        guard = threading.Lock()
+
+        def reader():
+            for _ in range(200):
+                with lock.read_locked():
+                    with guard:
+                        state['readers'] += 1
+                        if state['writers']:
+                            violations.append('read during write')
+                    with guard:
+                        state['readers'] -= 1
+
+        def writer():
+            for _ in range(100):
+                with lock.write_locked():
+                    with guard:
+                        state['writers'] += 1
+                        if state['writers'] > 1 or state['readers']:
+                            violations.append('write during read or write')
+                    time.sleep(0)
+                    with guard:
+                        state['writers'] -= 1
+
+        threads = [threading.Thread(target=reader) for _ in range(4)] + \
+            [threading.Thread(target=writer) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(violations, [])
+
+    def test_read_lock_cannot_be_upgraded(self):
+        lock = ReadWriteLock()
+        with lock.read_locked():
+            with self.assertRaises(RuntimeError):
+                lock.acquire_write()
+
+
+class ConcurrencyTest(JSONStorageTestCase):
+    def test_threaded_readers_and_writers(self):
+        storage = JSONStorage(self.data_dir, journal=True, compact_threshold=50)
+        errors = []
+
+        def write(worker):
+            try:
+                for i in range(50):
+                    doc = storage.insert_one('crops', {'worker': worker, 'i': i})
+                    storage.update_one('crops', doc['id'], {'done': True})
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                seen = 0
+                for _ in range(100):
+                    count = len(storage.find_all('crops'))
+                    # Documents are only ever added, so a reader never sees the count drop
+                    self.assertGreaterEqual(count, seen)
+                    seen = count
+                    storage.find('crops', {'worker': 0})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)] + \
+            [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(storage.count_documents('crops', {'done': True}), 200)
+        reopened = JSONStorage(self.data_dir, journal=True)
+        self.assertEqual(reopened.count_documents('crops', {'done': True}), 200)
+
+    def test_shared_instances_see_each_others_writes(self):
+        first = JSONStorage(self.data_dir, journal=True, shared=True)
+        second = JSONStorage(self.data_dir, journal=True, shared=True)
+
+        doc = first.insert_one('crops', {'v': 1})
+        self.assertEqual(second.find_by_id('crops', doc['id'])['v'], 1)
+        second.update_one('crops', doc['id'], {'v': 2})
+        self.assertEqual(first.find_by_id('crops', doc['id'])['v'], 2)
+        first.compact('crops')
+        second.insert_one('crops', {'v': 3})
+        self.assertEqual(first.count_documents('crops'), 2)
+
+        def write(storage):
+            for i in range(25):
+                storage.insert_one('crops', {'i': i})
+
+        threads = [threading.Thread(target=write, args=(storage,)) for storage in (first, second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(first.count_documents('crops'), 52)
+        self.assertEqual(second.count_documents('crops'), 52)
+        self.assertEqual(JSONStorage(self.data_dir).count_documents('crops'), 52)
+
+    def test_shared_instances_in_separate_processes(self):
+        storage = JSONStorage(self.data_dir, journal=True, shared=True, compact_threshold=20)
+        process = multiprocessing.get_context('spawn').Process(target=_insert_shared, args=(self.data_dir, 50))
+        process.start()
+        for i in range(50):
+            storage.insert_one('crops', {'i': i, 'pid': os.getpid()})
+        process.join(60)
+        self.assertEqual(process.exitcode, 0)
+
+        self.assertEqual(storage.count_documents('crops'), 100)
+        self.assertEqual(JSONStorage(self.data_dir, journal=True).count_documents('crops'), 100)
+
+
+class CrashRecoveryTest(JSONStorageTestCase):
+    def test_torn_journal_tail_is_dropped(self):
+        storage = JSONStorage(self.data_dir, journal=True)
+        storage.insert_many('crops', [{'v': 1}, {'v': 2}])
+        log_path = storage.get_log_path('crops')
+        clean_size = os.path.getsize(log_path)
+        with open(log_path, 'ab') as f:
+            f.write(b'{"op":"insert","doc":{"v":')
+
+        recovered = JSONStorage(self.data_dir, journal=True)
+        self.assertEqual(recovered.count_documents('crops'), 2)
+        self.assertEqual(os.path.getsize(log_path), clean_size)
+        recovered.insert_one('crops', {'v': 3})
+
+        self.assertEqual(sorted(d['v'] for d in JSONStorage(self.data_dir, journal=True).find_all('crops')),
+                         [1, 2, 3])
+
+    def test_compaction_interrupted_before_log_removal(self):
+        storage = JSONStorage(self.data_dir, journal=True)
+        first, second, third = storage.insert_many('crops', [{'v': 1}, {'v': 1}, {'v': 1}])
+        storage.update_one('crops', first['id'], {'v': 2})
+        storage.update_many('crops', {'v': 1}, {'v': 5})
+        storage.delete_one('crops', third['id'])
+        expected = {d['id']: d['v'] for d in storage.find_all('crops')}
+
+        # The snapshot was renamed into place but the crash hit before the log was removed
+        storage.save_collection('crops', storage.find_all('crops'))
+        self.assertTrue(os.path.exists(storage.get_log_path('crops')))
+
+        recovered = JSONStorage(self.data_dir, journal=True)
+        self.assertEqual({d['id']: d['v'] for d in recovered.find_all('crops')}, expected)
+        recovered.compact('crops')
+        self.assertEqual({d['id']: d['v'] for d in JSONStorage(self.data_dir).find_all('crops')}, expected)
+
+
+    def test_interrupted_compaction_does_not_rerun_bulk_queries(self):
+        storage = JSONStorage(self.data_dir, journal=True)
+        x = storage.insert_one('crops', {'v': 1})
+        storage.update_one('crops', x['id'], {'v': 2})
+        storage.compact('crops')
+        y = storage.insert_one('crops', {'v': 1})
+        self.assertEqual(storage.delete_many('crops', {'v': 1}), 1)
+        storage.update_one('crops', x['id'], {'v': 1})
+
+        # The snapshot now holds X with v=1, the log still has the delete_many
+        storage.save_collection('crops', storage.find_all('crops'))
+
+        recovered = JSONStorage(self.data_dir, journal=True)
+        self.assertEqual(recovered.find_by_id('crops', x['id'])['v'], 1)
+        self.assertIsNone(recovered.find_by_id('crops', y['id']))
+        self.assertEqual(recovered.count_documents('crops'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
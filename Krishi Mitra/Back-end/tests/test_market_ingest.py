@@ -0,0 +1,201 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from flask import Flask
+from models import MarketCache, MarketPrice, db
+from service.market_ingest import MarketIngestWorker
+from utils.http_client import UpstreamClient
+
+
+class StubResource:
+    """A paged data.gov.in-style resource served from localhost"""
+
+    def __init__(self, records, include_total=True, delay=0.05):
+        self.records = records
+        self.include_total = include_total
+        self.delay = delay
+        self.fail_at = None
+        self.offsets = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f'http://127.0.0.1:{self.server.server_port}/resource'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        resource = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                offset, limit = int(params['offset'][0]), int(params['limit'][0])
+                with resource._lock:
+                    resource.offsets.append(offset)
+                    resource.in_flight += 1
+                    resource.max_in_flight = max(resource.max_in_flight, resource.in_flight)
+                try:
+                    time.sleep(resource.delay)
+                    if resource.fail_at is not None and offset >= resource.fail_at:
+                        self.send_response(503)
+                        self.end_headers()
+                        return
+                    page = {'records': resource.records[offset:offset + limit]}
+                    if resource.include_total:
+                        page['total'] = len(resource.records)
+                    body = json.dumps(page).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with resource._lock:
+                        resource.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def make_records(count):
+    start = date(2024, 1, 1)
+    return [{
+        'commodity': 'Wheat',
+        'state': 'Punjab' if i % 2 else 'Haryana',
+        'district': 'Ludhiana' if i % 2 else 'Karnal',
+        'market': f'Mandi {i % 3}',
+        'modal_price': str(2000 + i),
+        'arrival_date': (start + timedelta(days=i)).strftime('%d/%m/%Y')
+    } for i in range(count)]
+
+
+class MarketIngestWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(self.tmp_dir, 'test.db')
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.checkpoint_path = os.path.join(self.tmp_dir, 'checkpoint.json')
+        self.resources = []
+
+    def tearDown(self):
+        for resource in self.resources:
+            resource.close()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        shutil.rmtree(self.tmp_dir)
+
+    def serve(self, records, **kwargs):
+        resource = StubResource(records, **kwargs)
+        self.resources.append(resource)
+        return resource
+
+    def worker(self, resource, concurrency=2):
+        # No retries so a failing page stops the run at once
+        client = UpstreamClient(max_retries=0, failure_threshold=100)
+        return MarketIngestWorker(resource.url, 'test-key', self.checkpoint_path, page_size=5,
+                                  concurrency=concurrency, http_client=client)
+
+    def checkpoint(self):
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_resumes_from_checkpoint_after_interrupted_run(self):
+        resource = self.serve(make_records(23))
+        resource.fail_at = 10
+        with self.assertRaises(requests.HTTPError):
+            self.worker(resource).run()
+
+        checkpoint = self.checkpoint()
+        self.assertFalse(checkpoint['complete'])
+        self.assertEqual(checkpoint['next_offset'], 10)
+        self.assertEqual(MarketPrice.query.count(), 10)
+
+        resource.fail_at = None
+        resource.offsets.clear()
+        stats = self.worker(resource).run()
+
+        self.assertEqual(resource.offsets[0], 10)
+        self.assertEqual(stats['inserted'], 13)
+        self.assertEqual(stats['pages'], 3)
+        self.assertEqual(MarketPrice.query.count(), 23)
+        self.assertTrue(self.checkpoint()['complete'])
+        self.assertEqual(MarketCache.query.count(), stats['cached'])
+        self.assertGreater(stats['cached'], 0)
+
+    def test_resumed_run_caches_keys_seen_before_interruption(self):
+        records = make_records(23)
+        for record in records[:10]:
+            record['state'] = 'Kerala'
+        resource = self.serve(records)
+        resource.fail_at = 10
+        with self.assertRaises(requests.HTTPError):
+            self.worker(resource).run()
+
+        resource.fail_at = None
+        self.worker(resource).run()
+
+        cached = MarketCache.query.filter_by(location='wheat_Kerala_all').one()
+        self.assertEqual(cached.data['current_price'], 2009.0)
+
+    def test_zero_prices_are_rejected(self):
+        records = make_records(7)
+        records[3]['modal_price'] = '0'
+        resource = self.serve(records)
+        stats = self.worker(resource).run()
+
+        self.assertEqual(stats['rejected'], 1)
+        self.assertEqual(MarketPrice.query.count(), 6)
+        self.assertTrue(self.checkpoint()['complete'])
+        self.assertGreater(stats['cached'], 0)
+
+    def test_concurrency_is_bounded(self):
+        resource = self.serve(make_records(60))
+        stats = self.worker(resource, concurrency=3).run()
+
+        self.assertEqual(stats['pages'], 12)
+        self.assertEqual(MarketPrice.query.count(), 60)
+        self.assertLessEqual(resource.max_in_flight, 3)
+        self.assertGreater(resource.max_in_flight, 1)
+
+    def test_stops_at_short_page_without_total(self):
+        resource = self.serve(make_records(12), include_total=False)
+        stats = self.worker(resource).run()
+
+        self.assertEqual(sorted(resource.offsets), [0, 5, 10])
+        self.assertEqual(stats['pages'], 3)
+        self.assertEqual(MarketPrice.query.count(), 12)
+
+    def test_rerun_after_completion_starts_over_without_duplicates(self):
+        resource = self.serve(make_records(12))
+        self.worker(resource).run()
+        stats = self.worker(resource).run()
+
+        self.assertEqual(stats['inserted'], 0)
+        self.assertEqual(stats['duplicates'], 12)
+        self.assertEqual(MarketPrice.query.count(), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe in-process cache with per-entry expiry and LRU eviction
+
+    Expired entries are kept for a further max_stale seconds so callers can
+    serve them through get_stale while a fresh value is fetched.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 300, max_stale: float = 0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_stale = max_stale
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a fresh value, or None when the key is missing or expired"""
+        result = self.get_stale(key)
+        if result is None or not result[1]:
+            return None
+        return result[0]
+
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        """Get (value, is_fresh), or None when the key is missing or past its stale window"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] + self.max_stale <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1] > now
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value for ttl seconds, evicting the least recently used entries"""
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a key if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and the current size"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Check whether a call for key is currently running"""
+        with self._lock:
+            return key in self._calls
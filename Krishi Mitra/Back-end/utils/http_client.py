@@ -0,0 +1,215 @@
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth retrying: the upstream is overloaded or a proxy timed out
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without contacting the upstream while its circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker
+
+    After failure_threshold failures in a row the circuit opens and calls
+    fail fast. Once reset_timeout seconds have passed a single trial call is
+    let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check whether a call may proceed"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class UpstreamClient:
+    """Shared HTTP client for third-party APIs
+
+    Keeps one keep-alive connection pool per host and applies connect/read
+    timeouts, bounded retries with jittered exponential backoff, and a
+    per-host circuit breaker to every request.
+    """
+
+    def __init__(self, connect_timeout: float = 3.05, read_timeout: float = 10,
+                 max_retries: int = 2, backoff_base: float = 0.2, backoff_max: float = 2.0,
+                 pool_maxsize: int = 10, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_maxsize = pool_maxsize
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._sessions: Dict[str, requests.Session] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the host's pool and circuit breaker
+
+        Connection errors, timeouts and retryable statuses are retried for
+        idempotent methods. Raises CircuitOpenError while the host's circuit
+        is open, and the last transport error once retries are exhausted.
+        """
+        method = method.upper()
+        host = urlsplit(url).netloc
+        session, breaker, metrics = self._host(host)
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = 1 + (self.max_retries if method in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            if not breaker.allow():
+                self._count(metrics, 'short_circuited')
+                raise CircuitOpenError(f"Circuit open for {host}")
+
+            if attempt:
+                self._count(metrics, 'retries')
+            self._count(metrics, 'requests')
+            started = time.monotonic()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(metrics, started, failed=True)
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+            except Exception:
+                self._record(metrics, started, failed=True)
+                breaker.record_failure()
+                raise
+            else:
+                failed = response.status_code >= 500 or response.status_code in RETRY_STATUSES
+                self._record(metrics, started, failed=failed)
+                if not failed:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt + 1 >= attempts or response.status_code not in RETRY_STATUSES:
+                    return response
+                response.close()
+
+            # Full jitter keeps retries from many workers from synchronising
+            time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+        raise AssertionError("unreachable")
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-host request counters, mean latency and circuit state"""
+        with self._lock:
+            result = {}
+            for host, metrics in self._metrics.items():
+                breaker = self._breakers[host]
+                completed = metrics['successes'] + metrics['failures']
+                result[host] = {
+                    **{k: int(v) for k, v in metrics.items() if k != 'latency_total'},
+                    'mean_latency_ms': round(1000 * metrics['latency_total'] / completed, 2) if completed else 0.0,
+                    'circuit_state': breaker.state,
+                    'consecutive_failures': breaker.failures
+                }
+            return result
+
+    def close(self) -> None:
+        """Close every pooled connection"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _host(self, host: str) -> Tuple[requests.Session, CircuitBreaker, Dict[str, float]]:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Retries are handled here so they are visible to the breaker
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._metrics[host] = dict.fromkeys(
+                    ('requests', 'successes', 'failures', 'retries', 'short_circuited', 'latency_total'), 0.0
+                )
+            return session, self._breakers[host], self._metrics[host]
+
+    def _count(self, metrics: Dict[str, float], key: str) -> None:
+        with self._lock:
+            metrics[key] += 1
+
+    def _record(self, metrics: Dict[str, float], started: float, failed: bool) -> None:
+        with self._lock:
+            metrics['latency_total'] += time.monotonic() - started
+            metrics['failures' if failed else 'successes'] += 1
+
+
+_client: Optional[UpstreamClient] = None
+_client_lock = threading.Lock()
+
+
+def get_upstream_client() -> UpstreamClient:
+    """Get the process-wide upstream client, creating it with defaults if needed"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = UpstreamClient()
+        return _client
+
+
+def configure_upstream_client(**kwargs) -> UpstreamClient:
+    """Replace the process-wide upstream client with one built from kwargs"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = UpstreamClient(**kwargs)
+        return _client
@@ -0,0 +1,72 @@
+import atexit
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from flask import current_app
+
+
+class ServiceRegistry:
+    """Application-scoped service instances, built once per worker process
+
+    Services are registered with a factory and optional warm-up and shutdown
+    hooks. Each is constructed on first use (or by warm_up) and then shared
+    by every request, so services must keep any mutable state thread-safe.
+    """
+
+    def __init__(self, app=None):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._warmups: Dict[str, Optional[Callable[[Any], None]]] = {}
+        self._shutdowns: Dict[str, Optional[Callable[[Any], None]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._order: List[str] = []  # construction order, reversed on shutdown
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.extensions['services'] = self
+        atexit.register(self.shutdown)
+
+    def register(self, name: str, factory: Callable[[], Any],
+                 warmup: Optional[Callable[[Any], None]] = None,
+                 shutdown: Optional[Callable[[Any], None]] = None) -> None:
+        with self._lock:
+            self._factories[name] = factory
+            self._warmups[name] = warmup
+            self._shutdowns[name] = shutdown
+
+    def get(self, name: str) -> Any:
+        """Get a service, constructing and warming it up on first use"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                if name not in self._factories:
+                    raise KeyError(f"Service '{name}' is not registered")
+                instance = self._factories[name]()
+                if self._warmups[name] is not None:
+                    self._warmups[name](instance)
+                self._instances[name] = instance
+                self._order.append(name)
+            return instance
+
+    def warm_up(self, names: Optional[List[str]] = None) -> None:
+        """Construct services ahead of the first request"""
+        for name in names or list(self._factories):
+            self.get(name)
+
+    def shutdown(self) -> None:
+        """Run shutdown hooks in reverse construction order and drop instances"""
+        with self._lock:
+            for name in reversed(self._order):
+                hook = self._shutdowns[name]
+                if hook is not None:
+                    hook(self._instances[name])
+            self._instances.clear()
+            self._order.clear()
+
+
+def get_service(name: str) -> Any:
+    """Get a service from the current app's registry"""
+    return current_app.extensions['services'].get(name)
@@ -2,7 +2,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 import os
-from models import User
+from utils.user_cache import load_user
 from functools import wraps
 from flask import request, jsonify
 from config import Config
@@ -37,7 +37,7 @@ def token_required(f):
         
         try:
             data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"]) # type: ignore
-            current_user = User.query.get(data['user_id'])
+            current_user = load_user(data['user_id'])
         except:
             return jsonify({'message': 'Token is invalid!'}), 401
         
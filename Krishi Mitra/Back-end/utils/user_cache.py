@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import User
+from utils.cache import TTLCache
+
+# Snapshots may lag a profile change in another worker by up to this long
+USER_CACHE_TTL = 60
+
+user_cache = TTLCache(max_entries=10000, default_ttl=USER_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Read-only copy of the user fields handlers and services read
+
+    Not attached to a session: load the User model to change a profile.
+    """
+    id: int
+    username: str
+    email: Optional[str]
+    language: Optional[str]
+    location: Optional[str]
+    farm_size: Optional[float]
+    preferred_crops: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserSnapshot':
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            language=user.language,
+            location=user.location,
+            farm_size=user.farm_size,
+            preferred_crops=user.preferred_crops
+        )
+
+
+def load_user(user_id: Any) -> Optional[UserSnapshot]:
+    """Get a user snapshot, hitting the database at most once per TTL
+
+    Lookups are memoized on flask.g for the rest of the request, then in
+    the process-wide cache.
+    """
+    if user_id is None:
+        return None
+    key = str(user_id)
+    request_users = g.setdefault('_users', {}) if has_app_context() else {}
+    if key in request_users:
+        return request_users[key]
+
+    snapshot = user_cache.get(key)
+    if snapshot is None:
+        user = User.query.get(user_id)
+        snapshot = UserSnapshot.from_user(user) if user else None
+        if snapshot is not None:
+            user_cache.set(key, snapshot)
+    request_users[key] = snapshot
+    return snapshot
+
+
+def invalidate_user(user_id: Any) -> None:
+    user_cache.delete(str(user_id))
+    if has_app_context():
+        g.get('_users', {}).pop(str(user_id), None)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+    # Invalidate again on commit, in case a concurrent read re-cached the old row
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _user_changes_committed(session):
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _user_changes_rolled_back(session):
+    session.info.pop('changed_users', None)